@@ -34,25 +34,27 @@ HTTP_204_NO_CONTENT = 204
 def step_impl(context):
     """ Delete all Products and load new ones """
     #
-    # List all of the products and delete them one by one
+    # List all of the products and delete them with one request
     #
     rest_endpoint = f"{context.base_url}/products"
     context.resp = requests.get(rest_endpoint)
     assert(context.resp.status_code == HTTP_200_OK)
-    for product in context.resp.json():
-        context.resp = requests.delete(f"{rest_endpoint}/{product['id']}")
-        assert(context.resp.status_code == HTTP_204_NO_CONTENT)
+    ids = [str(product['id']) for product in context.resp.json()]
+    if ids:
+        context.resp = requests.delete(rest_endpoint, params={"ids": ",".join(ids)})
+        assert(context.resp.status_code == HTTP_200_OK)
 
     #
-    # load the database with new products
+    # load the database with new products in a single batch
     #
+    payload = []
     for row in context.table:
-        payload = {
+        payload.append({
             "name": row['name'],
             "description": row['description'],
             "price": row['price'],
             "available": row['available'] in ['True', 'true', '1'],
             "category": row['category']
-        }
-        context.resp = requests.post(rest_endpoint, json=payload)
-        assert context.resp.status_code == HTTP_201_CREATED
+        })
+    context.resp = requests.post(f"{rest_endpoint}:batch", json=payload)
+    assert context.resp.status_code == HTTP_201_CREATED
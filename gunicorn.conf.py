@@ -0,0 +1,118 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Gunicorn configuration for the Product Store Service
+
+Gunicorn reads this file from the working directory, or use:
+    gunicorn --config gunicorn.conf.py 'service:create_app()'
+
+The worker and thread counts are derived from the CPUs the container
+may use. Every setting can be overridden with an environment variable:
+
+    GUNICORN_BIND            address to listen on (default 0.0.0.0:$PORT)
+    GUNICORN_WORKER_CLASS    gthread (default) or sync
+    GUNICORN_WORKERS         worker processes (default 2 x CPUs + 1)
+    GUNICORN_THREADS         threads per gthread worker (default 4)
+    GUNICORN_PRELOAD         load the app once before forking (default true)
+    GUNICORN_TIMEOUT         seconds before a silent worker is restarted (default 30)
+    GUNICORN_KEEPALIVE       seconds to wait on a keep-alive connection (default 5)
+    GUNICORN_MAX_REQUESTS    requests before a worker is recycled (default 1000, 0 never)
+    GUNICORN_MAX_REQUESTS_JITTER  random extra requests so workers do not recycle together (default 100)
+    GUNICORN_LOG_LEVEL       log level (default info)
+
+Each worker has its own connection pool, so the database must accept
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+"""
+import os
+
+
+def available_cpus() -> int:
+    """Returns how many CPUs this process may use, honoring container CPU quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    try:
+        # cgroup v2 quota, e.g. "150000 100000" for 1.5 CPUs or "max 100000"
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, -(-int(quota) // int(period))))  # round up
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ["true", "yes", "1"]
+
+
+######################################################################
+# Server socket and worker model
+######################################################################
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8080')}")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", str(2 * available_cpus() + 1)))
+# threads only apply to the gthread worker, the sync worker handles one request at a time
+threads = int(os.getenv("GUNICORN_THREADS", "4" if worker_class == "gthread" else "1"))
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = _env_bool("GUNICORN_PRELOAD", "true")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Heartbeat files on tmpfs so a slow disk cannot make workers look hung
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+######################################################################
+# Server hooks
+######################################################################
+def post_fork(server, worker):
+    """Gives each worker its own database connections and log thread"""
+    if not server.cfg.preload_app:
+        return
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+    from service.common.log_handlers import NonBlockingQueueHandler
+
+    app = server.app.wsgi()
+    with app.app_context():
+        # Connections the master opened must not be shared with the workers.
+        # close=False leaves them open for the master and only drops them here
+        db.engine.dispose(close=False)
+    # Threads do not survive a fork, so start the log writer again
+    for handler in app.logger.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            handler.restart_after_fork()
+    server.log.info("Worker %s ready", worker.pid)
+
+
+def child_exit(_server, worker):
+    """Removes the metrics of a worker that has exited"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess  # pylint: disable=import-outside-toplevel
+        multiprocess.mark_process_dead(worker.pid)
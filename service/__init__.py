@@ -18,41 +18,66 @@
 Package: service
 
 Package for the application models and service routes
-This module creates and configures the Flask app and sets up the logging
-and SQL database
+This module provides create_app() which creates and configures the Flask
+app and sets up the logging and SQL database. Nothing connects to the
+database until the first request needs it; tables and indexes are created
+explicitly with `flask db-create` or `flask db-migrate`.
 """
 import sys
 from flask import Flask
 from service import config
-from service.common import log_handlers
 
-# NOTE: Do not change the order of this code
-# The Flask app must be created
-# BEFORE you import modules that depend on it !!!
 
-# Create the Flask aoo
-app = Flask(__name__)  # pylint: disable=invalid-name
+def create_app(config_object=None) -> Flask:
+    """Creates and configures the Flask app
 
-# Load Configurations
-app.config.from_object(config)
+    :param config_object: settings that override service.config, either a
+        mapping or an object with upper case attributes
+    :return: the configured Flask app
+    """
+    # pylint: disable=import-outside-toplevel
+    # Import the modules that need Flask here so that importing the package
+    # (e.g. for the config or the async service) stays cheap
+    from service import routes, models
+    from service.common import cli_commands, error_handlers, log_handlers, metrics, sql_profiler
+    from service.common.json_provider import JSONProvider
 
-# Dependencies require we import the routes AFTER the Flask app is created
-# pylint: disable=wrong-import-position, wrong-import-order, cyclic-import
-from service import routes, models        # noqa: F401, E402
-from service.common import error_handlers, cli_commands  # noqa: F401, E402
+    # Create the Flask app
+    app = Flask(__name__)
 
-# Set up logging for production
-log_handlers.init_logging(app, "gunicorn.error")
+    # Load Configurations
+    app.config.from_object(config)
+    if isinstance(config_object, dict):
+        app.config.update(config_object)
+    elif config_object is not None:
+        app.config.from_object(config_object)
 
-app.logger.info(70 * "*")
-app.logger.info("  P E T   S E R V I C E   R U N N I N G  ".center(70, "*"))
-app.logger.info(70 * "*")
+    # Encode responses with the fastest JSON encoder that is installed
+    app.json = JSONProvider(app)
 
-try:
-    models.init_db(app)  # make our sqlalchemy tables
-except Exception as error:  # pylint: disable=broad-except
-    app.logger.critical("%s: Cannot continue", error)
-    # gunicorn requires exit code 4 to stop spawning workers when they die
-    sys.exit(4)
+    app.register_blueprint(routes.bp)
+    app.register_blueprint(error_handlers.bp)
+    app.register_blueprint(cli_commands.bp)
 
-app.logger.info("Service initialized!")
+    # Set up logging for production
+    log_handlers.init_logging(app, "gunicorn.error")
+
+    # Record request and database metrics for /metrics
+    metrics.init_metrics(app)
+
+    # Profile the SQL of each request when SQL_PROFILER_ENABLED is set
+    sql_profiler.init_profiler(app)
+
+    app.logger.info(70 * "*")
+    app.logger.info("  P E T   S E R V I C E   R U N N I N G  ".center(70, "*"))
+    app.logger.info(70 * "*")
+
+    try:
+        models.init_db(app)  # lazily binds SQLAlchemy, does not connect
+    except Exception as error:  # pylint: disable=broad-except
+        app.logger.critical("%s: Cannot continue", error)
+        # gunicorn requires exit code 4 to stop spawning workers when they die
+        sys.exit(4)
+
+    app.logger.info("Service initialized!")
+    return app
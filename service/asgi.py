@@ -0,0 +1,271 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Async Product Store Service
+
+An ASGI variant of the product routes in service/routes.py. The database
+calls run on an async SQLAlchemy engine, so one process can keep many of
+them in flight instead of blocking a worker for each round trip.
+Validation and serialization are shared with the sync routes through the
+Product model.
+
+Run it with any ASGI server, for example:
+    uvicorn service.asgi:app --port 8080
+"""
+import re
+import json
+import logging
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlencode
+from service import config
+from service import async_models
+from service.common import status  # HTTP Status Codes
+from service.common.pool_stats import engine_options
+from service.models import Product, DataValidationError, encode_cursor, decode_cursor
+
+logger = logging.getLogger("flask.app")
+
+
+class HTTPError(Exception):
+    """Used to stop handling a request and return an error response"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Request:  # pylint: disable=too-few-public-methods
+    """The parts of an ASGI HTTP request that the handlers use"""
+
+    def __init__(self, scope: dict, body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+        self.body = body
+
+    def get_json(self):
+        """Returns the body parsed as JSON"""
+        try:
+            return json.loads(self.body)
+        except ValueError as error:
+            raise HTTPError(status.HTTP_400_BAD_REQUEST, f"Invalid JSON: {error}") from error
+
+
+######################################################################
+#  D A T A B A S E   S E S S I O N S
+######################################################################
+_sessions = {}
+
+
+def get_sessionmaker():
+    """Returns the async session factory, creating the engine on first use"""
+    if "maker" not in _sessions:
+        settings = dict(vars(config), SQLALCHEMY_DATABASE_URI=config.ASYNC_DATABASE_URI or config.DATABASE_URI)
+        _sessions["maker"] = async_models.init_db(
+            settings["SQLALCHEMY_DATABASE_URI"], **engine_options(settings, asyncio=True)
+        )
+    return _sessions["maker"]
+
+
+async def dispose():
+    """Closes every connection of the async engine"""
+    maker = _sessions.pop("maker", None)
+    if maker is not None:
+        await maker.kw["bind"].dispose()
+
+
+######################################################################
+#  U T I L I T Y   F U N C T I O N S
+######################################################################
+def check_content_type(request: Request, content_type: str):
+    """Checks that the media type is correct"""
+    if request.headers.get("content-type") != content_type:
+        logger.error("Invalid Content-Type: %s", request.headers.get("content-type"))
+        raise HTTPError(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, f"Content-Type must be {content_type}")
+
+
+def get_page_limit(request: Request):
+    """Returns the page size requested with ?limit= or None if not paginating"""
+    limit = request.args.get("limit")
+    if limit is None:
+        return config.PAGE_SIZE_DEFAULT if "next" in request.args else None
+    if not (limit.isascii() and limit.isdecimal()) or int(limit) < 1:
+        raise HTTPError(status.HTTP_400_BAD_REQUEST, f"Invalid limit: '{limit}'")
+    return min(int(limit), config.PAGE_SIZE_MAX)
+
+
+######################################################################
+#  R O U T E   H A N D L E R S
+######################################################################
+async def healthcheck(_request: Request):
+    """Let them know our heart is still beating"""
+    return status.HTTP_200_OK, {"status": 200, "message": "OK"}, {}
+
+
+async def list_products(request: Request):
+    """Returns a list of Products"""
+    logger.info("Request to list Products...")
+    filters = Product.parse_filters(request.args)
+    keys = Product.sort_keys(filters, request.args.get("sort"))
+    limit = get_page_limit(request)
+    after_id, after_keys = decode_cursor(request.args["next"]) if "next" in request.args else (None, {})
+
+    async with get_sessionmaker()() as session:
+        rows, last = await async_models.find_rows(session, filters, keys, limit, after_id, after_keys)
+
+    headers = {}
+    if last is not None:
+        args = dict(request.args, limit=limit, next=encode_cursor(last.id, Product.cursor_keys(last, keys)))
+        headers["Link"] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    results = [Product.serialize_row(row) for row in rows]
+    logger.info("[%s] Products returned", len(results))
+    return status.HTTP_200_OK, results, headers
+
+
+async def create_products(request: Request):
+    """Creates a Product"""
+    logger.info("Request to Create a Product...")
+    check_content_type(request, "application/json")
+    product = Product().deserialize(request.get_json())
+
+    async with get_sessionmaker()() as session:
+        await async_models.create(session, product)
+
+    logger.info("Product with new id [%s] saved!", product.id)
+    return status.HTTP_201_CREATED, product.serialize(), {"Location": f"/products/{product.id}"}
+
+
+async def get_products(_request: Request, product_id: int):
+    """Retrieve a single Product"""
+    logger.info("Request to Retrieve a product with id [%s]", product_id)
+    async with get_sessionmaker()() as session:
+        product = await async_models.find(session, product_id)
+    if not product:
+        raise HTTPError(status.HTTP_404_NOT_FOUND, f"Product with id '{product_id}' was not found.")
+    return status.HTTP_200_OK, product.serialize(), {}
+
+
+async def update_products(request: Request, product_id: int):
+    """Update a Product"""
+    logger.info("Request to Update a product with id [%s]", product_id)
+    check_content_type(request, "application/json")
+    data = request.get_json()
+
+    async with get_sessionmaker()() as session:
+        product = await async_models.find(session, product_id)
+        if not product:
+            raise HTTPError(status.HTTP_404_NOT_FOUND, f"Product with id '{product_id}' was not found.")
+        product.deserialize(data)
+        product.id = product_id
+        await async_models.update(session, product)
+
+    return status.HTTP_200_OK, product.serialize(), {}
+
+
+async def delete_products(_request: Request, product_id: int):
+    """Delete a Product"""
+    logger.info("Request to Delete a product with id [%s]", product_id)
+    async with get_sessionmaker()() as session:
+        await async_models.remove(session, product_id)
+    return status.HTTP_204_NO_CONTENT, None, {}
+
+
+ROUTES = [
+    ("GET", re.compile(r"^/health$"), healthcheck),
+    ("GET", re.compile(r"^/products$"), list_products),
+    ("POST", re.compile(r"^/products$"), create_products),
+    ("GET", re.compile(r"^/products/(?P<product_id>\d+)$"), get_products),
+    ("PUT", re.compile(r"^/products/(?P<product_id>\d+)$"), update_products),
+    ("DELETE", re.compile(r"^/products/(?P<product_id>\d+)$"), delete_products),
+]
+
+
+def match_route(request: Request):
+    """Returns the handler for the request and its path parameters"""
+    allowed = False
+    for method, pattern, handler in ROUTES:
+        match = pattern.match(request.path)
+        if match:
+            if method == request.method:
+                return handler, {key: int(value) for key, value in match.groupdict().items()}
+            allowed = True
+    if allowed:
+        raise HTTPError(status.HTTP_405_METHOD_NOT_ALLOWED, "The method is not allowed for the requested URL.")
+    raise HTTPError(status.HTTP_404_NOT_FOUND, "The requested URL was not found on the server.")
+
+
+######################################################################
+#  A S G I   A P P L I C A T I O N
+######################################################################
+def error_response(status_code: int, message: str) -> tuple:
+    """Returns the same error body as the sync error handlers"""
+    return status_code, {"status": status_code, "error": HTTPStatus(status_code).phrase, "message": message}, {}
+
+
+async def handle(request: Request) -> tuple:
+    """Runs the handler for a request and turns exceptions into error responses"""
+    try:
+        handler, params = match_route(request)
+        return await handler(request, **params)
+    except HTTPError as error:
+        logger.warning(str(error))
+        return error_response(error.status_code, str(error))
+    except DataValidationError as error:
+        logger.warning(str(error))
+        return error_response(status.HTTP_400_BAD_REQUEST, str(error))
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("Unexpected error: %s", error)
+        return error_response(status.HTTP_500_INTERNAL_SERVER_ERROR, str(error))
+
+
+async def app(scope, receive, send):
+    """The ASGI application"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    status_code, data, headers = await handle(Request(scope, body))
+    content = b"" if data is None else json.dumps(data).encode("utf-8")
+    response_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+    if data is not None:
+        response_headers.append((b"content-type", b"application/json"))
+    response_headers.append((b"content-length", str(len(content)).encode("latin-1")))
+    await send({"type": "http.response.start", "status": status_code, "headers": response_headers})
+    await send({"type": "http.response.body", "body": content})
+
+
+async def lifespan(receive, send):
+    """Creates the engine when the server starts and disposes it when it stops"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            get_sessionmaker()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,111 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Async queries for the Product model
+
+These are the async equivalents of the Product class methods, run on an
+AsyncSession so one process can keep many database calls in flight. The
+Product mapping, filters and serialization are shared with the sync model.
+"""
+import logging
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from service.models import Product, catalog_summary, product_cache
+
+logger = logging.getLogger("flask.app")
+
+# Async drivers to use for each sync database URI scheme
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_uri(database_uri: str) -> str:
+    """Converts a sync database URI into one for the matching async driver"""
+    scheme, separator, rest = database_uri.partition("://")
+    if "+" in scheme or scheme not in ASYNC_DRIVERS:
+        return database_uri  # already names a driver
+    return ASYNC_DRIVERS[scheme] + separator + rest
+
+
+def init_db(database_uri: str, **engine_options):
+    """Creates an async engine and returns a factory for its sessions"""
+    logger.info("Initializing async database")
+    engine = create_async_engine(async_database_uri(database_uri), **engine_options)
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def find(session, product_id: int):
+    """Finds a Product by it's ID, or returns None if not found"""
+    logger.info("Processing lookup for id %s ...", product_id)
+    return await session.get(Product, product_id)
+
+
+async def find_rows(  # pylint: disable=too-many-arguments
+    session, filters: dict, keys: list = (), limit: int = None, after_id: int = None, after_keys: dict = None
+) -> tuple:
+    """Returns the rows of the Products matching the filters, a page at a time
+
+    :param filters: the filters from Product.parse_filters()
+    :param keys: the sort keys from Product.sort_keys()
+    :param limit: the maximum number of rows, or None for all of them
+    :param after_id: only return Products after the one with this id
+    :param after_keys: the sort key values of the Product with after_id
+
+    :return: the rows and the last one to continue after, or None if this is the last page
+    """
+    logger.info("Processing query for filters %s ...", filters)
+    statement = select(*Product.row_columns(keys)).where(*Product.filter_conditions(**filters))
+    if limit is None:
+        return (await session.execute(Product.order(statement, keys))).all(), None
+    if after_id is not None:
+        statement = Product.seek(statement, keys, after_id, after_keys)
+    # fetch one extra row to find out if there is a next page
+    rows = (await session.execute(Product.order(statement, keys).limit(limit + 1))).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]
+    return rows, None
+
+
+async def create(session, product: Product):
+    """Creates a Product in the database"""
+    logger.info("Creating %s", product.name)
+    product.id = None  # id must be none to generate next primary key
+    session.add(product)
+    await session.commit()
+    product_cache.invalidate(product.id)
+    catalog_summary.invalidate()
+
+
+async def update(session, product: Product):
+    """Updates a Product in the database"""
+    logger.info("Saving %s", product.name)
+    await session.commit()
+    product_cache.invalidate(product.id)
+    catalog_summary.invalidate()
+
+
+async def remove(session, product_id: int) -> int:
+    """Removes a Product from the database and returns how many were removed"""
+    logger.info("Deleting %s", product_id)
+    result = await session.execute(delete(Product).where(Product.id == product_id))
+    await session.commit()
+    product_cache.invalidate(product_id)
+    catalog_summary.invalidate()
+    return result.rowcount
@@ -0,0 +1,78 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Bulk Loading
+
+This module writes many Products at once from plain column values,
+without loading or tracking a Product object for each row, for the
+importer and `flask db-seed`.
+"""
+import io
+import csv
+import logging
+from sqlalchemy import insert, select, update
+from service.models import COLUMNS, Product, catalog_summary, db, product_cache
+
+logger = logging.getLogger("flask.app")
+
+
+def upsert_products(inserts: list, updates: list) -> set:
+    """
+    Inserts and updates many Products by id in a single transaction
+
+    Both are sent as executemany statements of plain column values.
+
+    :param inserts: the column values of the Products to create
+    :param updates: the column values and id of the Products to update
+    :return: the ids in updates that were not found, and not updated
+    """
+    logger.info("Inserting %s and updating %s Products", len(inserts), len(updates))
+    missing = set()
+    if updates:
+        ids = {values["id"] for values in updates}
+        found = set(db.session.scalars(select(Product.id).where(Product.id.in_(ids))))
+        missing = ids - found
+        updates = [values for values in updates if values["id"] in found]
+    if updates:
+        db.session.execute(update(Product), updates)
+    if inserts:
+        db.session.execute(insert(Product), inserts)
+    db.session.commit()
+    for values in updates:
+        product_cache.invalidate(values["id"])
+    catalog_summary.invalidate()
+    return missing
+
+
+def insert_rows(connection, rows: list):
+    """Inserts rows of column values with one multi-row INSERT"""
+    connection.execute(Product.__table__.insert(), [dict(zip(COLUMNS, row)) for row in rows])
+
+
+def copy_rows(connection, rows: list):
+    """Streams rows of column values into PostgreSQL with COPY, the fastest way to load them"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (name, description, price, available, category.name)
+        for name, description, price, available, category in rows
+    )
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY product ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
@@ -0,0 +1,127 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Cache
+
+This module contains an in-process least recently used cache whose
+entries also expire after a time to live
+"""
+import time
+import threading
+from collections import OrderedDict
+
+# Number of invalidation counters, shared by the keys that hash to the same one
+GENERATION_SLOTS = 4096
+
+
+class LRUCache:  # pylint: disable=too-many-instance-attributes
+    """A thread safe LRU cache with a time to live and hit/miss counters
+
+    A maxsize of 0 disables the cache: every lookup is a miss and nothing
+    is stored.
+
+    To fill it after a miss, read generation(key) before loading the value
+    and pass it to set(). If the key was invalidated while the value was
+    being loaded, set() drops it instead of caching a stale copy.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = [0] * GENERATION_SLOTS
+        self._cleared = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def configure(self, maxsize: int, ttl: float):
+        """Changes the size and time to live, dropping all of the entries"""
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._entries.clear()
+            self._cleared += 1
+
+    def get(self, key):
+        """Returns the value cached for the key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= self._timer():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key) -> int:
+        """Returns a number that changes whenever the key is invalidated, pass it to set()"""
+        with self._lock:
+            return self._cleared + self._generations[hash(key) % GENERATION_SLOTS]
+
+    def set(self, key, value, generation: int = None):
+        """Caches a value for the key, evicting the least recently used entry if full
+
+        :param generation: generation(key) from before the value was loaded.
+            If the key was invalidated since then, the value is not cached.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._cleared + self._generations[hash(key) % GENERATION_SLOTS]:
+                return
+            self._entries[key] = (self._timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Removes the entry for the key if there is one"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[hash(key) % GENERATION_SLOTS] += 1
+
+    def clear(self):
+        """Removes all of the entries"""
+        with self._lock:
+            self._entries.clear()
+            self._cleared += 1
+
+    def stats(self) -> dict:
+        """Returns the counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
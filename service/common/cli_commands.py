@@ -1,15 +1,33 @@
 """
 Flask CLI Command Extensions
 """
-from service import app
+import os
+import json
+import time
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
 from service.models import db
+from service.common.search import search_index_ddl
+from service.common.seeding import seed_products
+from service.common.importer import EXTENSIONS, ProductImporter, read_records
+from service.common.load_generator import DEFAULT_MIX, LoadGenerator, format_report, parse_mix
+
+# Registers the commands directly on `flask` rather than in a group
+bp = Blueprint("cli_commands", __name__, cli_group=None)
+
+# Indexes that earlier versions created and the current ones replace, by table
+OBSOLETE_INDEXES = {
+    "product": ("ix_product_name", "ix_product_price", "ix_product_available", "ix_product_category_available"),
+}
 
 
 ######################################################################
 # Command to force tables to be rebuilt
 # Usage: flask db-create
 ######################################################################
-@app.cli.command("db-create")
+@bp.cli.command("db-create")
 def db_create():
     """
     Recreates a local database. You probably should not use this on
@@ -18,3 +36,203 @@ def db_create():
     db.drop_all()
     db.create_all()
     db.session.commit()
+
+
+######################################################################
+# Command to add missing tables and indexes without dropping data
+# Usage: flask db-migrate
+######################################################################
+@bp.cli.command("db-migrate")
+def db_migrate():
+    """
+    Creates any missing tables and indexes, including the full text search
+    index, without dropping data. On PostgreSQL indexes are built with
+    CREATE INDEX CONCURRENTLY so the table stays writable while they are built,
+    and the invalid indexes a failed build left behind are rebuilt. Indexes
+    that newer ones replace are dropped, so they no longer slow down writes.
+    """
+    db.create_all()  # only creates the tables that do not exist yet
+    drop_invalid_indexes()
+    drop_obsolete_indexes()
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            click.echo(f"Creating index {index.name} on {table.name}...")
+            create_index(index)
+    click.echo("Creating the full text search index...")
+    create_search_index()
+    click.echo("Database is up to date")
+
+
+def drop_invalid_indexes():
+    """Drops the indexes that a failed CREATE INDEX CONCURRENTLY left invalid
+
+    PostgreSQL keeps such an index, so IF NOT EXISTS would skip it although
+    queries cannot use it. Once dropped it is created again like a missing one.
+    """
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in sorted(invalid_indexes(conn)):
+            click.echo(f"Dropping invalid index {name}...")
+            drop_index(conn, name)
+
+
+def drop_obsolete_indexes():
+    """Drops the indexes in OBSOLETE_INDEXES that are still in the database"""
+    inspector = inspect(db.engine)
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table, names in OBSOLETE_INDEXES.items():
+            existing = {index["name"] for index in inspector.get_indexes(table)}
+            for name in names:
+                if name in existing:
+                    click.echo(f"Dropping obsolete index {name} on {table}...")
+                    drop_index(conn, name)
+
+
+def drop_index(conn, name: str):
+    """Drops an index on an AUTOCOMMIT connection, concurrently if supported"""
+    concurrently = " CONCURRENTLY" if conn.dialect.name == "postgresql" else ""
+    conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {conn.dialect.identifier_preparer.quote(name)}"))
+
+
+def invalid_indexes(conn) -> set:
+    """Returns the names of the invalid indexes on our tables"""
+    if conn.dialect.name != "postgresql":
+        return set()  # only PostgreSQL builds indexes that can be left invalid
+    rows = conn.execute(
+        text(
+            "SELECT index_class.relname FROM pg_index"
+            " JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid"
+            " JOIN pg_class table_class ON table_class.oid = pg_index.indrelid"
+            " WHERE NOT pg_index.indisvalid AND pg_table_is_visible(table_class.oid)"
+            " AND table_class.relname = ANY(:tables)"
+        ),
+        {"tables": list(db.metadata.tables)},
+    )
+    return {name for (name,) in rows}
+
+
+def create_index(index):
+    """Creates an index outside of a transaction, concurrently if supported"""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+        if conn.dialect.name == "postgresql":
+            sql = sql.replace("INDEX", "INDEX CONCURRENTLY", 1)
+        conn.execute(text(sql))
+
+
+def create_search_index():
+    """Creates the full text search index if it is missing"""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in search_index_ddl(conn.dialect.name, concurrently=True):
+            conn.execute(text(statement))
+
+
+######################################################################
+# Command to fill the database with synthetic products
+# Usage: flask db-seed --count 1000000
+######################################################################
+@bp.cli.command("db-seed")
+@click.option("--count", type=click.IntRange(min=1), default=1000, show_default=True,
+              help="Number of products to add.")
+@click.option("--batch-size", type=click.IntRange(min=1), default=10000, show_default=True,
+              help="Products generated and loaded at a time.")
+@click.option("--seed", type=int, help="Seed for a repeatable catalog.")
+def db_seed(count, batch_size, seed):
+    """
+    Adds synthetic products to the database for testing at scale. They
+    are loaded with COPY on PostgreSQL and multi-row inserts elsewhere,
+    in one transaction, so an interrupted seed adds nothing.
+    """
+    db.create_all()  # only creates the tables that do not exist yet
+    start = time.perf_counter()
+    with click.progressbar(length=count, label="Seeding products") as progress:
+        seed_products(db.engine, count, batch_size, seed, progress.update)
+    elapsed = time.perf_counter() - start
+    click.echo(f"Added {count} products in {elapsed:.2f} s ({count / elapsed:,.0f} rows/s)")
+
+
+######################################################################
+# Command to import products from a CSV or NDJSON file
+# Usage: flask db-import products.csv
+######################################################################
+@bp.cli.command("db-import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(sorted(set(EXTENSIONS.values()))),
+              help="Format of the file, by default from its extension.")
+@click.option("--upsert", is_flag=True, help="Update the products of records that have an id.")
+@click.option("--batch-size", type=click.IntRange(min=1), help="Products written per transaction.")
+def db_import(path, file_format, upsert, batch_size):
+    """
+    Imports products from a CSV or NDJSON file a line at a time, with the
+    same validation as the API, and reports the lines that are not valid.
+    """
+    file_format = file_format or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if file_format is None:
+        raise click.BadParameter("cannot tell the format from the extension, use --format", param_hint="PATH")
+    importer = ProductImporter(
+        batch_size=batch_size or current_app.config["IMPORT_BATCH_SIZE"],
+        upsert=upsert,
+        errors_max=current_app.config["IMPORT_ERRORS_MAX"],
+    )
+    with open(path, encoding="utf-8-sig", newline="") as lines:  # skips a byte order mark
+        summary = importer.run(read_records(lines, file_format))
+    for error in summary["errors"]:
+        click.echo(f"line {error['line']}: {error['message']}", err=True)
+    click.echo(
+        f"Read {summary['records']} records: {summary['created']} created, "
+        f"{summary['updated']} updated, {summary['error_count']} errors"
+    )
+    if summary["error_count"]:
+        raise click.exceptions.Exit(1)
+
+
+######################################################################
+# Command to load test a running service
+# Usage: flask load-test --url http://localhost:8080 --rate 100
+######################################################################
+def _mix_option(_ctx, _param, value):
+    try:
+        return parse_mix(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error)) from error
+
+
+@bp.cli.command("load-test")
+@click.option("--url", default="http://localhost:8080", show_default=True, help="Base URL of the running service.")
+@click.option("--rate", type=click.FloatRange(min=0, min_open=True), default=50.0, show_default=True,
+              help="Requests started per second, whether or not earlier ones have finished.")
+@click.option("--duration", type=click.FloatRange(min=0, min_open=True), default=30.0, show_default=True,
+              help="Seconds to keep starting requests.")
+@click.option("--concurrency", type=click.IntRange(min=1), default=32, show_default=True,
+              help="Most requests in flight at once.")
+@click.option("--mix", default=DEFAULT_MIX, show_default=True, callback=_mix_option,
+              help="Relative weight of each operation.")
+@click.option("--arrivals", type=click.Choice(["poisson", "uniform"]), default="poisson", show_default=True,
+              help="Random or evenly spaced arrivals.")
+@click.option("--seed", type=int, help="Seed for a repeatable sequence of requests.")
+@click.option("--output", type=click.Path(dir_okay=False), help="Also write the report to this JSON file.")
+@click.option("--update-existing", is_flag=True,
+              help="Also update the Products that were there before the run, overwriting their data.")
+def load_test(  # pylint: disable=too-many-arguments
+    url, rate, duration, concurrency, mix, arrivals, seed, output, update_existing
+):
+    """
+    Sends a mix of create, list, get, update and delete requests to a
+    running service at a fixed rate and reports the latency percentiles
+    and throughput of each. Use it to size workers and connection pools.
+    Only the products the run creates are deleted, and only they are
+    updated unless --update-existing is given.
+    """
+    generator = LoadGenerator(url, mix, rate, duration, concurrency, arrivals, seed, update_existing=update_existing)
+    try:
+        report = generator.run()
+    except (OSError, RuntimeError) as error:
+        raise click.ClickException(f"Cannot load test {url}: {error}") from error
+    click.echo(format_report(report))
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,208 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+
+"""
+Product Importer
+
+This module imports Products from CSV or NDJSON (one JSON object per
+line) a line at a time, for the /products:import endpoint and the
+`flask db-import` command. Each record is validated by
+Product.deserialize, and they are written a batch per transaction, so
+only one batch is held in memory however large the upload is.
+
+The Product model has no natural key, so upserts are keyed on the id:
+records with an id update that Product, and records without one create
+a new Product.
+"""
+import csv
+import json
+import logging
+from sqlalchemy.exc import SQLAlchemyError
+from service.models import COLUMNS, Product, DataValidationError, db
+from service.common.bulk import upsert_products
+
+logger = logging.getLogger("flask.app")
+
+# Formats by media type and by file extension
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+BOOLEANS = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+
+######################################################################
+# Readers
+#
+# These yield (line number, record) for every record in a text stream,
+# or (line number, DataValidationError) for one that cannot be parsed.
+######################################################################
+def read_ndjson(lines):
+    """Reads one JSON object per line, skipping blank lines"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield number, DataValidationError(f"Invalid JSON: {error}")
+            continue
+        if not isinstance(record, dict):
+            yield number, DataValidationError("Each line must be a JSON object")
+            continue
+        yield number, record
+
+
+def read_csv(lines):
+    """Reads CSV with a header row, converting the columns that are not strings"""
+    reader = csv.DictReader(lines)
+    number = 1  # the header
+    for row in reader:
+        number, start = reader.line_num, number + 1
+        if None in row:
+            yield start, DataValidationError(f"Expected {len(reader.fieldnames)} columns, found more")
+            continue
+        try:
+            yield start, _csv_record(row)
+        except DataValidationError as error:
+            yield start, error
+
+
+def _csv_record(row: dict) -> dict:
+    """Converts a CSV row to the types Product.deserialize expects"""
+    record = dict(row)
+    if record.get("available") is not None:
+        value = record["available"].strip().lower()
+        if value not in BOOLEANS:
+            raise DataValidationError(f"Invalid available: '{record['available']}'")
+        record["available"] = BOOLEANS[value]
+    record["id"] = record.get("id") or None
+    if record["id"] is not None:
+        value = record["id"].strip()
+        if not (value.isascii() and value.isdecimal()):
+            raise DataValidationError(f"Invalid id: '{record['id']}'")
+        record["id"] = int(value)
+    return record
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def read_records(lines, file_format: str):
+    """Reads records in a format, ending with an error if the text cannot be decoded"""
+    number = 0
+    try:
+        for number, record in READERS[file_format](lines):
+            yield number, record
+    except UnicodeDecodeError as error:
+        yield number + 1, DataValidationError(f"Invalid UTF-8, import stopped: {error.reason}")
+    except csv.Error as error:
+        yield number + 1, DataValidationError(f"Invalid CSV, import stopped: {error}")
+
+
+######################################################################
+# Importer
+######################################################################
+class ProductImporter:  # pylint: disable=too-many-instance-attributes
+    """Validates records and writes them to the database a batch at a time"""
+
+    def __init__(self, batch_size: int = 1000, upsert: bool = False, errors_max: int = 100):
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.errors_max = errors_max
+        self.records = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line: int, message: str):
+        """Counts an error, and reports it if there have not been too many"""
+        self.error_count += 1
+        if len(self.errors) < self.errors_max:
+            self.errors.append({"line": line, "message": message})
+
+    def values(self, record: dict) -> dict:
+        """Returns the validated column values of a record, with its id when upserting"""
+        product = Product().deserialize(record)
+        values = {column: getattr(product, column) for column in COLUMNS}
+        if self.upsert and record.get("id") is not None:
+            if not isinstance(record["id"], int) or isinstance(record["id"], bool):
+                raise DataValidationError(f"Invalid id: '{record['id']}'")
+            values["id"] = record["id"]
+        return values
+
+    def run(self, records) -> dict:
+        """Imports (line number, record) pairs and returns the summary"""
+        batch = []
+        for line, record in records:
+            self.records += 1
+            try:
+                if isinstance(record, DataValidationError):
+                    raise record
+                batch.append((line, self.values(record)))
+            except DataValidationError as error:
+                self.error(line, str(error))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        logger.info("Imported %s records: %s created, %s updated, %s errors",
+                    self.records, self.created, self.updated, self.error_count)
+        return self.summary()
+
+    def write(self, batch: list):
+        """Writes one batch of (line number, values) in a transaction
+
+        If the database rejects the batch it is written again a line at a
+        time, so only the lines it rejects are reported as errors.
+        """
+        try:
+            self.write_batch(batch)
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            if len(batch) == 1:
+                self.error(batch[0][0], f"Rejected by the database: {getattr(error, 'orig', None) or error}")
+                return
+            logger.warning("Batch of %s records rejected, writing them one at a time: %s", len(batch), error)
+            for item in batch:
+                self.write([item])
+
+    def write_batch(self, batch: list):
+        """Writes one batch of (line number, values) in a transaction"""
+        inserts = [values for _, values in batch if "id" not in values]
+        updates = [values for _, values in batch if "id" in values]
+        missing = upsert_products(inserts, updates)
+        for line, values in batch:
+            if values.get("id") in missing:
+                self.error(line, f"Product with id '{values['id']}' was not found.")
+        self.created += len(inserts)
+        self.updated += len(updates) - sum(1 for values in updates if values["id"] in missing)
+
+    def summary(self) -> dict:
+        """Returns the counts and the first errors"""
+        return {
+            "records": self.records,
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
@@ -0,0 +1,68 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+JSON Provider
+
+This module contains a Flask JSON provider that encodes responses with
+orjson when it is installed and falls back to the standard library
+"""
+from enum import Enum
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(value):
+    """Encodes the types that JSON does not support natively"""
+    if isinstance(value, Decimal):
+        return str(value)  # keep the exact precision of prices
+    if isinstance(value, Enum):
+        return value.name
+    return DefaultJSONProvider.default(value)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson when it is installed
+
+    The encoder is chosen with the JSON_ENCODER setting: "auto" uses orjson
+    if it can be imported, "json" always uses the standard library.
+    Decimals are written as strings and Enums by their name with either
+    encoder.
+    """
+
+    default = staticmethod(_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        encoder = app.config.get("JSON_ENCODER", "auto")
+        self.use_orjson = orjson is not None and encoder != "json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize data as JSON to a string"""
+        # orjson output is always compact so the separators can be ignored
+        if not self.use_orjson or set(kwargs) - {"separators", "indent"}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option).decode("utf-8")
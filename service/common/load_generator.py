@@ -0,0 +1,275 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+
+"""
+Load Generator
+
+This module drives a running instance of the service with a weighted mix
+of create, list, get, update and delete requests and reports their
+latency percentiles and throughput. It is used by `flask load-test`.
+
+Requests arrive open loop: they are started on a schedule at the given
+rate whether or not earlier ones have finished, like real clients do.
+Latency is measured from when a request was scheduled, so time spent
+waiting for a free client counts, and a slow service cannot hide it by
+slowing down the load (coordinated omission).
+
+The catalog that was there before the run is only read. Deletes go to
+the Products the run created, and so do updates unless update_existing
+is set.
+"""
+import json
+import time
+import random
+import threading
+import http.client
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from service.common.seeding import PRODUCT_CATEGORIES, PRODUCT_NAMES, PRICE_RANGE
+
+OPERATIONS = ("create", "list", "get", "update", "delete")
+DEFAULT_MIX = "create=1,list=3,get=10,update=2,delete=1"
+
+CATEGORIES = tuple(category.name for category in PRODUCT_CATEGORIES)
+
+
+def parse_mix(value: str) -> dict:
+    """Parses "operation=weight,..." into the weight of each operation"""
+    mix = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}', use {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError as error:
+            raise ValueError(f"Invalid weight for {name}: '{weight}'") from error
+        if mix[name] < 0:
+            raise ValueError(f"Invalid weight for {name}: '{weight}'")
+    if not sum(mix.values()):
+        raise ValueError("The mix must give at least one operation a weight")
+    return mix
+
+
+def percentile(values: list, percent: float) -> float:
+    """Returns the nearest rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(int(-(-percent * len(values) // 100)), 1)  # round up
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    """Summarizes (latency, status) samples into counts, throughput and latency percentiles"""
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = Counter(str(status) for _, status in samples)
+    return {
+        "count": len(samples),
+        "errors": sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+class LoadGenerator:  # pylint: disable=too-many-instance-attributes
+    """Sends a mix of requests to a running service at a fixed arrival rate"""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        base_url: str,
+        mix: dict,
+        rate: float,
+        duration: float,
+        concurrency: int = 32,
+        arrivals: str = "poisson",
+        seed: int = None,
+        timeout: float = 10.0,
+        update_existing: bool = False,
+    ):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.https = url.scheme == "https"
+        self.prefix = url.path.rstrip("/")
+        self.mix = mix
+        self.rate = rate
+        self.duration = duration
+        self.concurrency = concurrency
+        self.arrivals = arrivals
+        self.timeout = timeout
+        self.update_existing = update_existing
+        self._random = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ids = []  # Products that get can use
+        self._created = []  # Products this run created, the only ones it updates and deletes
+        self._samples = defaultdict(list)
+
+    ##################################################
+    # HTTP
+    ##################################################
+    def _connection(self):
+        """Returns this thread's keep-alive connection to the service"""
+        if getattr(self._local, "connection", None) is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._local.connection = connection_class(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        """Sends one request and returns its status and decoded JSON body"""
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        connection = self._connection()
+        try:
+            connection.request(method, self.prefix + path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+        data = json.loads(content) if content and response.getheader("Content-Type", "").startswith(
+            "application/json"
+        ) else None
+        return response.status, data
+
+    ##################################################
+    # Operations
+    ##################################################
+    def _product(self) -> dict:
+        return {
+            "name": self._random.choice(PRODUCT_NAMES),
+            "description": f"Load test product {self._random.randrange(1_000_000)}",
+            "price": f"{self._random.uniform(*PRICE_RANGE):.2f}",
+            "available": self._random.choice([True, False]),
+            "category": self._random.choice(CATEGORIES),
+        }
+
+    def _pick_id(self, ids):
+        with self._lock:
+            return self._random.choice(ids) if ids else None
+
+    def create(self):
+        """POST /products"""
+        status, data = self.request("POST", "/products", self._product())
+        if status == 201:
+            with self._lock:
+                self._ids.append(data["id"])
+                self._created.append(data["id"])
+        return status
+
+    def list(self):
+        """GET /products, one page of a category"""
+        return self.request("GET", f"/products?category={self._random.choice(CATEGORIES)}&limit=100")[0]
+
+    def get(self):
+        """GET /products/<id>"""
+        product_id = self._pick_id(self._ids)
+        return self.request("GET", f"/products/{product_id}")[0] if product_id else None
+
+    def update(self):
+        """PUT /products/<id> of a Product this run created, or any Product with update_existing"""
+        product_id = self._pick_id(self._ids if self.update_existing else self._created)
+        return self.request("PUT", f"/products/{product_id}", self._product())[0] if product_id else None
+
+    def delete(self):
+        """DELETE /products/<id> of a Product this run created"""
+        with self._lock:
+            if not self._created:
+                return None
+            product_id = self._created.pop(self._random.randrange(len(self._created)))
+            self._ids.remove(product_id)
+        return self.request("DELETE", f"/products/{product_id}")[0]
+
+    ##################################################
+    # Driver
+    ##################################################
+    def _call(self, operation: str, scheduled: float):
+        try:
+            status = getattr(self, operation)()
+        except (OSError, http.client.HTTPException, ValueError) as error:
+            status = f"error: {type(error).__name__}"
+        latency = time.perf_counter() - scheduled
+        if status is None:
+            return  # nothing to do yet, like a delete before anything was created
+        with self._lock:
+            self._samples[operation].append((latency, status))
+
+    def _interval(self) -> float:
+        if self.arrivals == "poisson":
+            return self._random.expovariate(self.rate)
+        return 1.0 / self.rate
+
+    def run(self) -> dict:
+        """Sends requests for the duration and returns the report"""
+        status, data = self.request("GET", "/products?limit=1000")
+        if status != 200:
+            raise RuntimeError(f"GET /products returned {status}")
+        self._ids = [product["id"] for product in data]
+        operations = list(self.mix)
+        weights = [self.mix[operation] for operation in operations]
+
+        start = time.perf_counter()
+        scheduled = start
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while scheduled - start < self.duration:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._call, self._random.choices(operations, weights)[0], scheduled)
+                scheduled += self._interval()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed: float) -> dict:
+        """Returns the latency and throughput of each operation and of all of them"""
+        samples = [sample for operation in self._samples.values() for sample in operation]
+        return {
+            "duration_s": round(elapsed, 2),
+            "offered_rps": self.rate,
+            "concurrency": self.concurrency,
+            "total": summarize(samples, elapsed),
+            "operations": {
+                operation: summarize(self._samples[operation], elapsed)
+                for operation in OPERATIONS if operation in self._samples
+            },
+        }
+
+
+def format_report(report: dict) -> str:
+    """Formats a report as a table"""
+    lines = [
+        f"{report['duration_s']} s at {report['offered_rps']} requests/s offered, "
+        f"{report['concurrency']} concurrent clients",
+        f"{'operation':<10} {'count':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}",
+    ]
+    rows = list(report["operations"].items()) + [("total", report["total"])]
+    for name, stats in rows:
+        lines.append(
+            f"{name:<10} {stats['count']:>7} {stats['errors']:>7} {stats['throughput_rps']:>8} "
+            f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}"
+        )
+    return "\n".join(lines)
@@ -19,19 +19,182 @@ Log Handlers
 
 This module contains utility functions to set up logging
 consistently
+
+Records are put on a queue by the request thread and formatted and
+written by a background thread, so logging never waits on I/O. DEBUG
+and INFO records can be sampled per logger, and long messages are
+truncated.
 """
+import atexit
+import json
 import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+# Logger used by the modules that run outside of a request
+SHARED_LOGGER = "flask.app"
+
+# Attributes of every LogRecord, anything else was passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def truncate(message: str, limit: int) -> str:
+    """Shortens a message to the limit, saying how much was cut"""
+    if limit <= 0 or len(message) <= limit:
+        return message
+    return f"{message[:limit]}... [{len(message) - limit} characters truncated]"
+
+
+class TextFormatter(logging.Formatter):
+    """The plain text log format, with long messages truncated"""
+
+    def __init__(self, message_max: int = 2000):
+        super().__init__(TEXT_FORMAT, DATE_FORMAT)
+        self.message_max = message_max
+
+    def formatMessage(self, record) -> str:
+        record.message = truncate(record.message, self.message_max)
+        return super().formatMessage(record)
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line
+
+    Values passed with ``extra=`` are added as fields of the object.
+    """
+
+    def __init__(self, message_max: int = 2000):
+        super().__init__()
+        self.message_max = message_max
+
+    def format(self, record) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": truncate(record.getMessage(), self.message_max),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the DEBUG and INFO records of some loggers
+
+    Rates are looked up by logger name and then by each of its parents,
+    so a rate for "service" also applies to "service.routes". WARNING and
+    above are always kept.
+    """
+
+    def __init__(self, rates: dict, rand=random.random):
+        super().__init__()
+        self.rates = rates
+        self._random = rand
+
+    def rate(self, name: str) -> float:
+        """Returns the fraction of records kept for a logger"""
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        return self._random() < self.rate(record.name)
+
+
+def parse_sample_rates(value: str) -> dict:
+    """Parses "logger=rate,..." into a dictionary of rates"""
+    rates = {}
+    for item in value.split(","):
+        if item.strip():
+            name, _, rate = item.partition("=")
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Puts records on a bounded queue without waiting, dropping them when it is full
+
+    Records are left for the listener thread to format. They are not
+    pickled, so they do not have to be formatted on the request thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.listener = None
+
+    def start(self, *handlers):
+        """Starts a thread that writes the queued records to the handlers"""
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def restart_after_fork(self):
+        """Starts a new queue and thread in a forked process, which has neither"""
+        if self.listener is not None:
+            handlers = self.listener.handlers
+            self.queue = queue.Queue(self.queue.maxsize)
+            self.start(*handlers)
+
+    def stop(self):
+        """Writes the records that are still queued and stops the thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 def init_logging(app, logger_name: str):
     """Set up logging for production"""
-    app.logger.propagate = False
+    loggers = [app.logger]
+    if app.logger.name != SHARED_LOGGER:
+        loggers.append(logging.getLogger(SHARED_LOGGER))
     gunicorn_logger = logging.getLogger(logger_name)
-    app.logger.handlers = gunicorn_logger.handlers
-    app.logger.setLevel(gunicorn_logger.level)
+    # Write to gunicorn's handlers when it is running us
+    handlers = list(gunicorn_logger.handlers) or [logging.StreamHandler()]
+    level = gunicorn_logger.level or app.config.get("LOGGING_LEVEL", logging.INFO)
     # Make all log formats consistent
-    format_string = "[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s"
-    formatter = logging.Formatter(format_string, "%Y-%m-%d %H:%M:%S %z")
-    for handler in app.logger.handlers:
+    if app.config.get("LOG_FORMAT", "json") == "json":
+        formatter = JSONFormatter(app.config.get("LOG_MESSAGE_MAX", 2000))
+    else:
+        formatter = TextFormatter(app.config.get("LOG_MESSAGE_MAX", 2000))
+    for handler in handlers:
         handler.setFormatter(formatter)
+
+    # Stop the thread of an app that was created before this one
+    for logger in loggers:
+        for handler in logger.handlers:
+            if isinstance(handler, NonBlockingQueueHandler):
+                handler.stop()
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(app.config.get("LOG_QUEUE_SIZE", 10000)))
+    rates = parse_sample_rates(app.config.get("LOG_SAMPLE_RATES", ""))
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+    queue_handler.start(*handlers)
+    atexit.register(queue_handler.stop)
+    for logger in loggers:
+        logger.propagate = False
+        logger.setLevel(level)
+        logger.handlers = [queue_handler]
     app.logger.info("Logging handler established")
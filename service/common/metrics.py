@@ -0,0 +1,133 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Metrics
+
+This module records request and database metrics and serves them at
+/metrics in the Prometheus text format.
+
+When PROMETHEUS_MULTIPROC_DIR is set (it must be set before this module
+is imported) every gunicorn worker writes its metrics to that directory
+and /metrics aggregates all of them, whichever worker answers.
+"""
+import os
+import time
+import prometheus_client as prometheus
+from prometheus_client import multiprocess
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = prometheus.Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+REQUEST_LATENCY = prometheus.Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = prometheus.Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", multiprocess_mode="livesum"
+)
+DB_QUERIES = prometheus.Counter(
+    "db_queries_total", "Database statements executed", ["operation"]
+)
+DB_QUERY_LATENCY = prometheus.Histogram(
+    "db_query_duration_seconds", "Database statement latency", ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def init_metrics(app):
+    """Records metrics for every request and statement and serves /metrics"""
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.teardown_request(_end_request)
+    if not event.contains(Engine, "before_cursor_execute", _start_query):
+        event.listen(Engine, "before_cursor_execute", _start_query)
+        event.listen(Engine, "after_cursor_execute", _record_query)
+    app.add_url_rule("/metrics", "metrics", metrics)
+
+
+def metrics():
+    """Returns all of the metrics in the Prometheus text format"""
+    registry = prometheus.REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus.generate_latest(registry), 200, {"Content-Type": prometheus.CONTENT_TYPE_LATEST}
+
+
+######################################################################
+# Request hooks
+######################################################################
+def _route():
+    """Returns the route pattern so ids do not create new label values"""
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+
+def _start_request():
+    """Starts timing a request"""
+    g.metrics_start = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+def _record_request(response):
+    """Notes the status of a request for _end_request to record"""
+    g.metrics_status = str(response.status_code)
+    return response
+
+
+def _end_request(_error):
+    """Counts and times a request and stops counting it as in flight
+
+    This runs once the request context is torn down, which for a body
+    streamed with ``stream_with_context`` is after it has been sent.
+    """
+    if "metrics_start" not in g:
+        return
+    IN_FLIGHT.dec()
+    if "metrics_status" in g:
+        elapsed = time.perf_counter() - g.metrics_start
+        REQUESTS.labels(request.method, _route(), g.metrics_status).inc()
+        REQUEST_LATENCY.labels(request.method, _route()).observe(elapsed)
+
+
+######################################################################
+# Statement hooks
+######################################################################
+def _start_query(_conn, _cursor, _statement, _parameters, context, _executemany):
+    """Starts timing a statement on its execution context
+
+    A statement that fails never reaches _record_query, and its start
+    time goes away with its context instead of staying on the pooled
+    connection.
+    """
+    if context is not None:
+        context.metrics_query_start = time.perf_counter()
+
+
+def _record_query(_conn, _cursor, statement, _parameters, context, _executemany):
+    """Counts and times a statement by its operation (SELECT, INSERT, ...)"""
+    start = getattr(context, "metrics_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    operation = (statement.split(None, 1) or ["UNKNOWN"])[0].upper()
+    DB_QUERIES.labels(operation).inc()
+    DB_QUERY_LATENCY.labels(operation).observe(elapsed)
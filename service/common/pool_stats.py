@@ -0,0 +1,135 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Pool Statistics
+
+This module contains a connection pool that records how long requests
+wait to check out a connection, and functions to configure it and to
+report its state
+"""
+import time
+import threading
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds in seconds of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class Histogram:
+    """A thread safe histogram of durations in seconds"""
+
+    def __init__(self, buckets: tuple = WAIT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Records one duration"""
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        """Returns the cumulative bucket counts, the count and the sum"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        buckets = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "count": count, "sum": round(total, 6)}
+
+
+class CheckoutTelemetry:  # pylint: disable=too-few-public-methods
+    """How long checkouts from every InstrumentedQueuePool waited"""
+
+    def __init__(self):
+        self.wait = Histogram()
+        self.timeouts = 0
+
+
+telemetry = CheckoutTelemetry()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            telemetry.timeouts += 1
+            raise
+        finally:
+            telemetry.wait.observe(time.perf_counter() - start)
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """An InstrumentedQueuePool for the asyncio engine of the ASGI app"""
+
+
+def engine_options(settings, asyncio: bool = False) -> dict:
+    """Returns the engine options for the database in an app's settings
+
+    They are chosen from the database the app really uses, which may have
+    been overridden after service.config read DATABASE_URI. In-memory
+    SQLite keeps the single static connection Flask-SQLAlchemy gives it,
+    every other database gets an InstrumentedQueuePool, or an
+    InstrumentedAsyncQueuePool for an asyncio engine.
+
+    :param settings: the app config
+    :param asyncio: whether the options are for create_async_engine
+    """
+    options = dict(settings.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    url = make_url(settings["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+    options.setdefault("poolclass", InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool)
+    options.setdefault("pool_size", settings["DB_POOL_SIZE"])
+    options.setdefault("max_overflow", settings["DB_MAX_OVERFLOW"])
+    options.setdefault("pool_timeout", settings["DB_POOL_TIMEOUT"])
+    return options
+
+
+def pool_stats(engine) -> dict:
+    """Returns the state of an engine's connection pool and the checkout waits"""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            timeout=pool.timeout(),
+        )
+    stats["checkout_wait"] = telemetry.wait.snapshot()
+    stats["checkout_timeouts"] = telemetry.timeouts
+    return stats
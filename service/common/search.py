@@ -0,0 +1,133 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Full Text Search
+
+PostgreSQL searches a GIN expression index on the tsvector of the name
+and description, which it keeps up to date by itself. SQLite searches
+an FTS5 table that triggers keep in sync with the product table. Both
+are created with the table, or added to a database by `flask db-migrate`.
+
+SearchMatch and SearchRank are SQL expressions that compile to the
+search of whichever database a query runs on.
+"""
+import re
+from sqlalchemy import bindparam
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.types import Boolean, Float, String
+
+SEARCH_CONFIG = "english"
+SEARCH_LENGTH_MAX = 200
+# queries must use the same expression as the index for it to be used
+SEARCH_VECTOR = f"to_tsvector('{SEARCH_CONFIG}', name || ' ' || description)"
+
+
+def search_index_ddl(dialect: str, concurrently: bool = False) -> list:
+    """Returns the statements that create the full text search index
+
+    They can be run again safely, and on SQLite they rebuild the FTS5
+    table from the products that are already in the database.
+
+    :param dialect: the name of the database dialect
+    :param concurrently: build the PostgreSQL index without locking out writes
+    """
+    if dialect == "postgresql":
+        option = "CONCURRENTLY " if concurrently else ""
+        return [
+            f"CREATE INDEX {option}IF NOT EXISTS ix_product_search ON product USING gin ({SEARCH_VECTOR})",
+        ]
+    if dialect == "sqlite":
+        return [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+            "name, description, content='product', content_rowid='id', tokenize='porter unicode61')",
+            "CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product BEGIN "
+            "INSERT INTO product_search(rowid, name, description) VALUES (new.id, new.name, new.description); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product BEGIN "
+            "INSERT INTO product_search(product_search, rowid, name, description) "
+            "VALUES ('delete', old.id, old.name, old.description); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS product_search_update AFTER UPDATE OF name, description ON product BEGIN "
+            "INSERT INTO product_search(product_search, rowid, name, description) "
+            "VALUES ('delete', old.id, old.name, old.description); "
+            "INSERT INTO product_search(rowid, name, description) VALUES (new.id, new.name, new.description); "
+            "END",
+            "INSERT INTO product_search(product_search) VALUES ('rebuild')",
+        ]
+    return []
+
+
+def _fts5_query(search: str) -> str:
+    """Quotes every word so FTS5 matches all of them instead of parsing its query syntax"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", search))
+
+
+class SearchMatch(ColumnElement):  # pylint: disable=abstract-method,too-many-ancestors
+    """True for the Products whose name or description match a full text search"""
+
+    type = Boolean()
+    inherit_cache = False
+
+    def __init__(self, search: str):
+        self.search = search
+
+
+class SearchRank(ColumnElement):  # pylint: disable=abstract-method,too-many-ancestors
+    """How well a Product matches a full text search, higher is better"""
+
+    type = Float()
+    inherit_cache = False
+
+    def __init__(self, search: str):
+        self.search = search
+
+
+@compiles(SearchMatch)
+@compiles(SearchRank)
+def _compile_search(element, compiler, **_kw):
+    raise CompileError(f"Full text search is not supported on {compiler.dialect.name}")
+
+
+@compiles(SearchMatch, "postgresql")
+def _compile_search_match_postgresql(element, compiler, **kw):
+    search = compiler.process(bindparam(None, element.search, type_=String), **kw)
+    return f"{SEARCH_VECTOR} @@ websearch_to_tsquery('{SEARCH_CONFIG}', {search})"
+
+
+@compiles(SearchRank, "postgresql")
+def _compile_search_rank_postgresql(element, compiler, **kw):
+    search = compiler.process(bindparam(None, element.search, type_=String), **kw)
+    # ts_rank() is a real, widened so the value a cursor holds compares equal to it again
+    return f"CAST(ts_rank({SEARCH_VECTOR}, websearch_to_tsquery('{SEARCH_CONFIG}', {search})) AS double precision)"
+
+
+@compiles(SearchMatch, "sqlite")
+def _compile_search_match_sqlite(element, compiler, **kw):
+    search = compiler.process(bindparam(None, _fts5_query(element.search), type_=String), **kw)
+    return f"product.id IN (SELECT rowid FROM product_search WHERE product_search MATCH {search})"
+
+
+@compiles(SearchRank, "sqlite")
+def _compile_search_rank_sqlite(element, compiler, **kw):
+    search = compiler.process(bindparam(None, _fts5_query(element.search), type_=String), **kw)
+    # bm25() is lower for better matches
+    return (
+        "(SELECT -bm25(product_search) FROM product_search "
+        f"WHERE product_search MATCH {search} AND product_search.rowid = product.id)"
+    )
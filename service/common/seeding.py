@@ -0,0 +1,113 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+
+"""
+Catalog Seeding
+
+This module generates realistic synthetic Products and loads them in
+bulk for `flask db-seed`. Names, categories, prices and availability
+follow the same distributions as ProductFactory in the tests, which
+takes its choices from here.
+
+Rows are loaded in one transaction, with COPY on PostgreSQL and batched
+multi-row inserts elsewhere. On SQLite the full text search insert
+trigger is dropped for the load and the FTS5 table is rebuilt once at
+the end, even if the load fails, which is several times faster than
+indexing row by row.
+"""
+import random
+from decimal import Decimal
+from sqlalchemy import text
+from service.models import Category, catalog_summary
+from service.common.bulk import copy_rows, insert_rows
+from service.common.search import search_index_ddl
+
+PRODUCT_NAMES = ("Hat", "Pants", "Shirt", "Apple", "Banana", "Pots", "Towels", "Ford", "Chevy", "Hammer", "Wrench")
+PRODUCT_CATEGORIES = tuple(Category)
+PRICE_RANGE = (0.5, 2000.0)  # uniform, in whole cents
+DESCRIPTION_WORDS = (
+    "a", "the", "and", "with", "for", "of", "new", "classic", "durable", "light", "heavy", "soft",
+    "steel", "cotton", "wooden", "organic", "fresh", "compact", "large", "small", "red", "blue",
+    "green", "black", "white", "vintage", "modern", "premium", "everyday", "outdoor", "kitchen",
+    "garage", "garden", "family", "travel", "winter", "summer", "set", "pack", "edition",
+)
+DESCRIPTION_POOL_SIZE = 10000
+
+
+def random_descriptions(rand: random.Random, count: int = DESCRIPTION_POOL_SIZE) -> list:
+    """Returns count random descriptions of 4 to 24 words"""
+    return [
+        " ".join(rand.choices(DESCRIPTION_WORDS, k=rand.randint(4, 24))).capitalize() + "."
+        for _ in range(count)
+    ]
+
+
+def generate_products(count: int, rand: random.Random, descriptions: list = None) -> list:
+    """Returns the column values of count random Products
+
+    Descriptions are drawn from a pool, since composing one per row
+    would take most of the time of a seed.
+    """
+    low, high = (round(bound * 100) for bound in PRICE_RANGE)
+    span = high - low + 1
+    descriptions = descriptions or random_descriptions(rand)
+    return [
+        (name, description, Decimal(low + int(rand.random() * span)).scaleb(-2), rand.random() < 0.5, category)
+        for name, description, category in zip(
+            rand.choices(PRODUCT_NAMES, k=count),
+            rand.choices(descriptions, k=count),
+            rand.choices(PRODUCT_CATEGORIES, k=count),
+        )
+    ]
+
+
+def seed_products(engine, count: int, batch_size: int = 10000, seed: int = None, progress=None) -> int:
+    """Adds count random Products to the database
+
+    :param engine: the engine of the database to seed
+    :param count: how many Products to add
+    :param batch_size: how many Products to generate and load at a time
+    :param seed: seed for a repeatable catalog, or None for a random one
+    :param progress: called with the number of Products loaded by each batch
+
+    :return: the number of Products added
+    """
+    rand = random.Random(seed)
+    descriptions = random_descriptions(rand)
+    dialect = engine.dialect.name
+    load = copy_rows if dialect == "postgresql" else insert_rows
+    try:
+        with engine.begin() as connection:
+            if dialect == "sqlite":
+                connection.execute(text("DROP TRIGGER IF EXISTS product_search_insert"))
+            for start in range(0, count, batch_size):
+                rows = generate_products(min(batch_size, count - start), rand, descriptions)
+                load(connection, rows)
+                if progress:
+                    progress(len(rows))
+            # give the query planner statistics about the new rows
+            connection.execute(text("ANALYZE product"))
+    finally:
+        if dialect == "sqlite":
+            # pysqlite commits DDL that comes before any DML on its own, so the
+            # trigger stays dropped if the load is rolled back. Recreate it and
+            # index the new rows in a transaction of their own.
+            with engine.begin() as connection:
+                for statement in search_index_ddl(dialect):
+                    connection.execute(text(statement))
+    catalog_summary.invalidate()
+    return count
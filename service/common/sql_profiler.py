@@ -0,0 +1,124 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+SQL Profiler
+
+This module counts and times the SQL statements issued by each request
+when SQL_PROFILER_ENABLED is set. The totals are returned in the
+Server-Timing and X-Query-Count response headers, and statements slower
+than SLOW_QUERY_MS are logged with their parameters.
+"""
+import heapq
+import time
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestProfile:
+    """The statements issued while handling one request"""
+
+    def __init__(self, top: int):
+        self.top = top
+        self.count = 0
+        self.total = 0.0
+        self._slowest = []  # min-heap of (seconds, order, statement)
+
+    def record(self, statement: str, elapsed: float):
+        """Adds one statement, keeping only the slowest few"""
+        self.count += 1
+        self.total += elapsed
+        entry = (elapsed, self.count, statement)
+        if len(self._slowest) < self.top:
+            heapq.heappush(self._slowest, entry)
+        elif self._slowest and elapsed > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self) -> list:
+        """Returns (seconds, statement) for the slowest statements, slowest first"""
+        return [(elapsed, statement) for elapsed, _, statement in sorted(self._slowest, reverse=True)]
+
+
+def init_profiler(app):
+    """Profiles the SQL of every request when SQL_PROFILER_ENABLED is set"""
+    app.before_request(_start_profile)
+    app.after_request(_report_profile)
+    if not event.contains(Engine, "before_cursor_execute", _start_statement):
+        event.listen(Engine, "before_cursor_execute", _start_statement)
+        event.listen(Engine, "after_cursor_execute", _record_statement)
+
+
+def _profile():
+    """Returns the profile of the current request, or None if not profiling"""
+    if has_request_context():
+        return g.get("sql_profile")
+    return None
+
+
+######################################################################
+# Request hooks
+######################################################################
+def _start_profile():
+    """Starts a profile for the request if the profiler is enabled"""
+    if current_app.config["SQL_PROFILER_ENABLED"]:
+        g.sql_profile = RequestProfile(current_app.config["SQL_PROFILER_TOP"])
+
+
+def _report_profile(response):
+    """Adds the profile to the response headers and logs the slowest statements"""
+    profile = _profile()
+    if profile is None:
+        return response
+    total_ms = profile.total * 1000
+    response.headers["X-Query-Count"] = str(profile.count)
+    response.headers.add("Server-Timing", f'db;dur={total_ms:.2f};desc="{profile.count} queries"')
+    if profile.count:
+        current_app.logger.info(
+            "%s %s issued %s queries in %.2f ms, slowest: %s",
+            request.method, request.path, profile.count, total_ms,
+            "; ".join(f"{elapsed * 1000:.2f} ms {statement}" for elapsed, statement in profile.slowest),
+        )
+    return response
+
+
+######################################################################
+# Statement hooks
+######################################################################
+def _start_statement(_conn, _cursor, _statement, _parameters, context, _executemany):
+    """Starts timing a statement on its execution context if the request is being profiled
+
+    A statement that fails never reaches _record_statement, and its start
+    time goes away with its context instead of staying on the pooled
+    connection.
+    """
+    if _profile() is not None and context is not None:
+        context.profiler_query_start = time.perf_counter()
+
+
+def _record_statement(_conn, _cursor, statement, parameters, context, _executemany):
+    """Adds a statement to the request profile and logs it if it was slow"""
+    profile = _profile()
+    start = getattr(context, "profiler_query_start", None)
+    if profile is None or start is None:
+        return
+    elapsed = time.perf_counter() - start
+    profile.record(statement, elapsed)
+    if elapsed * 1000 >= current_app.config["SLOW_QUERY_MS"]:
+        current_app.logger.warning(
+            "Slow query (%.2f ms): %s parameters: %r", elapsed * 1000, statement, parameters
+        )
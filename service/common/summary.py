@@ -0,0 +1,129 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+
+"""
+Summary
+
+This module contains an in-process summary of a numeric column grouped
+by a key. It is loaded with grouped SQL and then kept up to date with
+the rows that are added and removed, until it expires.
+"""
+import time
+import threading
+
+
+class GroupSummary:  # pylint: disable=too-many-instance-attributes
+    """A thread safe count, minimum, maximum and sum of a value for each group
+
+    Adding and removing rows updates the counts and sums exactly. Removing
+    the minimum or maximum of a group cannot be applied without reading
+    the group again, so it marks the summary as stale instead. Values
+    that are only computed by a full load, like percentiles, are kept in
+    ``extra`` until the summary expires.
+    """
+
+    def __init__(self, ttl: float = 300.0, timer=time.monotonic):
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._groups = None  # {key: [count, minimum, maximum, total]}
+        self._extra = None
+        self._expires = 0.0
+        self._version = 0
+        self.loads = 0
+        self.updates = 0
+
+    def configure(self, ttl: float):
+        """Changes the time to live, dropping the summary"""
+        with self._lock:
+            self.ttl = ttl
+            self._drop()
+
+    @property
+    def version(self) -> int:
+        """Changes whenever rows are added or removed, pass it to load()"""
+        return self._version
+
+    def snapshot(self):
+        """Returns a copy of the groups and the extra values, or None if they must be loaded"""
+        with self._lock:
+            if self._groups is None or self._expires <= self._timer():
+                return None
+            return {key: tuple(group) for key, group in self._groups.items()}, self._extra
+
+    def load(self, groups: dict, extra=None, version: int = None):
+        """Replaces the summary with groups read from the database
+
+        :param groups: (count, minimum, maximum, total) keyed by group
+        :param extra: any other values computed with them
+        :param version: the version from before they were read. If rows
+            were added or removed since then the load is dropped, because
+            the groups may be missing them
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._groups = {key: list(group) for key, group in groups.items()}
+            self._extra = extra
+            self._expires = self._timer() + self.ttl
+            self.loads += 1
+
+    def add(self, key, value):
+        """Adds a row with the value to its group"""
+        with self._lock:
+            self._version += 1
+            if self._groups is None:
+                return
+            group = self._groups.get(key)
+            if group is None:
+                self._groups[key] = [1, value, value, value]
+            else:
+                group[0] += 1
+                group[1] = min(group[1], value)
+                group[2] = max(group[2], value)
+                group[3] += value
+            self.updates += 1
+
+    def remove(self, key, value):
+        """Removes a row with the value from its group"""
+        with self._lock:
+            self._version += 1
+            if self._groups is None:
+                return
+            group = self._groups.get(key)
+            if group is None:
+                self._drop()  # the row was never counted, read it all again
+                return
+            if group[0] == 1:
+                del self._groups[key]
+            elif value in (group[1], group[2]):
+                self._drop()  # the new minimum or maximum is unknown
+                return
+            else:
+                group[0] -= 1
+                group[3] -= value
+            self.updates += 1
+
+    def invalidate(self):
+        """Drops the summary so the next snapshot() has to load it again"""
+        with self._lock:
+            self._version += 1
+            self._drop()
+
+    def _drop(self):
+        self._groups = None
+        self._extra = None
@@ -28,17 +28,36 @@ description (string) - the description the product belongs to (i.e., dog, cat)
 available (boolean) - True for products that are available for adoption
 
 """
+import base64
+import binascii
+import json
 import logging
+import math
+import re
 from enum import Enum
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, event, func, literal, or_, text, tuple_, update
+from service.common.cache import LRUCache
+from service.common.pool_stats import engine_options
+from service.common.search import SEARCH_LENGTH_MAX, SearchMatch, SearchRank, search_index_ddl
+from service.common.summary import GroupSummary
 
 logger = logging.getLogger("flask.app")
 
 # Create the SQLAlchemy object to be initialized later in init_db()
 db = SQLAlchemy()
 
+# Serialized Products by id, sized from the app config in init_db()
+product_cache = LRUCache()
+
+# Price statistics by (category, available), kept up to date by the writes below
+catalog_summary = GroupSummary()
+
+# Price percentiles reported by Product.stats()
+PERCENTILES = (50, 90, 99)
+
 
 def init_db(app):
     """Initialize the SQLAlchemy app"""
@@ -50,17 +69,143 @@ class DataValidationError(Exception):
 
 
 class Category(Enum):
-    """Enumeration of valid Product Categories"""
+    """Enumeration of valid Product Categories
+
+    The values match the names so every JSON encoder writes the name, and
+    the database stores the name either way.
+    """
+
+    UNKNOWN = "UNKNOWN"
+    CLOTHS = "CLOTHS"
+    FOOD = "FOOD"
+    HOUSEWARES = "HOUSEWARES"
+    AUTOMOTIVE = "AUTOMOTIVE"
+    TOOLS = "TOOLS"
+
+
+# Columns that listings can be sorted by
+SORT_FIELDS = ("id", "name", "price", "available", "category")
+
+# Columns of a Product other than its id
+COLUMNS = ("name", "description", "price", "available", "category")
+# Columns checked against their length before they reach the database
+TEXT_COLUMNS = ("name", "description")
+
+
+def _parse_category(value: str) -> Category:
+    """Converts a query string value into a Category"""
+    try:
+        return getattr(Category, value.upper())
+    except AttributeError as error:
+        raise DataValidationError(f"Invalid category: '{value}'") from error
+
+
+def _parse_bool(key: str, value: str) -> bool:
+    """Converts a query string value into a boolean"""
+    if value.lower() in ["true", "yes", "1"]:
+        return True
+    if value.lower() in ["false", "no", "0"]:
+        return False
+    raise DataValidationError(f"Invalid {key}: '{value}'")
+
+
+def _parse_price(key: str, value: str) -> Decimal:
+    """Converts a query string value into a finite Decimal price"""
+    try:
+        price = Decimal(value.strip(' "'))
+    except InvalidOperation as error:
+        raise DataValidationError(f"Invalid {key}: '{value}'") from error
+    if not price.is_finite():
+        raise DataValidationError(f"Invalid {key}: '{value}'")
+    return price
+
+
+def _parse_text(key: str, value, length: int) -> str:
+    """Validates a text column value, which must be a string that fits the column"""
+    if not isinstance(value, str):
+        raise DataValidationError(f"Invalid {key}: must be a string")
+    if len(value) > length:
+        raise DataValidationError(f"Invalid {key}: longer than {length} characters")
+    return value
+
+
+def _parse_search(value: str) -> str:
+    """Validates the text of a full text search"""
+    search = value.strip()
+    if not re.search(r"\w", search):
+        raise DataValidationError(f"Invalid q: '{value}' has no words to search for")
+    if len(search) > SEARCH_LENGTH_MAX:
+        raise DataValidationError(f"Invalid q: longer than {SEARCH_LENGTH_MAX} characters")
+    return search
+
+
+def _parse_cursor_key(name: str, value):
+    """Converts a sort key value from a cursor back into the type of its key"""
+    expected = {"id": int, "name": str, "price": str, "available": bool, "category": str, "rank": (int, float)}
+    if not isinstance(value, expected[name]) or (name == "id" and isinstance(value, bool)):
+        raise DataValidationError(f"Invalid cursor: bad value for {name}")
+    if name == "price":
+        return _parse_price("cursor", value)
+    if name == "category":
+        return _parse_category(value)
+    return value
+
+
+def _group_stats(groups: list, available: list) -> dict:
+    """Combines (count, min, max, sum) groups into counts and price statistics"""
+    count = sum(group[0] for group in groups)
+    price = {"min": None, "max": None, "avg": None}
+    if count:
+        price["min"] = str(min(group[1] for group in groups))
+        price["max"] = str(max(group[2] for group in groups))
+        average = sum((Decimal(str(group[3])) for group in groups), Decimal(0)) / count
+        try:
+            price["avg"] = str(average.quantize(Decimal("0.01")))
+        except InvalidOperation:  # too many digits to round to cents
+            price["avg"] = str(average)
+    return {"count": count, "available": sum(group[0] for group in available), "price": price}
+
+
+def _replace_summary_entry(old, new):
+    """Moves an updated Product from its old catalog summary entry to its new one"""
+    if old is None or new is None:
+        catalog_summary.invalidate()
+    elif old != new:
+        catalog_summary.remove(*old)
+        catalog_summary.add(*new)
 
-    UNKNOWN = 0
-    CLOTHS = 1
-    FOOD = 2
-    HOUSEWARES = 3
-    AUTOMOTIVE = 4
-    TOOLS = 5
 
+def encode_cursor(product_id: int, keys: list = None) -> str:
+    """Encodes the last Product on a page into an opaque cursor
 
-class Product(db.Model):
+    :param product_id: the id of the last Product on the page
+    :param keys: its sort key values by sort field, if the page is not
+        ordered by id alone, see Product.cursor_keys
+    """
+    value = {"id": product_id}
+    if keys:
+        value["keys"] = keys
+    value = json.dumps(value).encode("utf-8")
+    return base64.urlsafe_b64encode(value).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decodes an opaque cursor back into the id and sort key values to continue after"""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        product_id = value["id"]
+        if not isinstance(product_id, int) or isinstance(product_id, bool):
+            raise TypeError("id must be an integer")
+        keys = value.get("keys", {})
+        if not isinstance(keys, dict):
+            raise TypeError("keys must be an object")
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError) as error:
+        raise DataValidationError(f"Invalid cursor: {error}") from error
+    return product_id, keys
+
+
+class Product(db.Model):  # pylint: disable=too-many-public-methods
     """
     Class that represents a Product
 
@@ -80,6 +225,16 @@ class Product(db.Model):
         db.Enum(Category), nullable=False, server_default=(Category.UNKNOWN.name)
     )
 
+    # Indexes that span columns. Use `flask db-migrate` to add any that are
+    # missing from an existing database. The sortable columns are indexed
+    # with the id so that sorted pages, which break ties on the id, are
+    # read straight from the index without a sort
+    __table_args__ = (
+        db.Index("ix_product_name_id", "name", "id"),
+        db.Index("ix_product_price_id", "price", "id"),
+        db.Index("ix_product_category_available_price_id", "category", "available", "price", "id"),
+    )
+
     ##################################################
     # INSTANCE METHODS
     ##################################################
@@ -94,8 +249,14 @@ class Product(db.Model):
         logger.info("Creating %s", self.name)
         # id must be none to generate next primary key
         self.id = None  # pylint: disable=invalid-name
+        entry = self.summary_entry()
         db.session.add(self)
         db.session.commit()
+        product_cache.invalidate(self.id)
+        if entry is None:
+            catalog_summary.invalidate()  # a column default was used
+        else:
+            catalog_summary.add(*entry)
 
     def update(self):
         """
@@ -104,13 +265,71 @@ class Product(db.Model):
         logger.info("Saving %s", self.name)
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
+        old, new = self.summary_entry(committed=True), self.summary_entry()
         db.session.commit()
+        product_cache.invalidate(self.id)
+        _replace_summary_entry(old, new)
+
+    def update_if_unchanged(self, changes) -> bool:
+        """
+        Updates a Product with the values of another, if it was not changed since it was read
+
+        The UPDATE only matches the row while every column still has the
+        values this Product was read with, so of two concurrent updates
+        based on the same read only the first one is written.
+
+        :param changes: a Product with the new values, e.g. from deserialize
+        :return: True if it was updated, False if it was changed or removed
+        """
+        logger.info("Saving %s if unchanged", self.name)
+        old, new = self.summary_entry(committed=True), changes.summary_entry()
+        result = db.session.execute(
+            update(Product)
+            .where(Product.id == self.id, *[getattr(Product, column) == getattr(self, column) for column in COLUMNS])
+            .values({column: getattr(changes, column) for column in COLUMNS})
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()  # also expires self, so it is read again when used
+        product_cache.invalidate(self.id)
+        if result.rowcount != 1:
+            return False
+        _replace_summary_entry(old, new)
+        return True
 
     def delete(self):
         """Removes a Product from the data store"""
         logger.info("Deleting %s", self.name)
+        entry = self.summary_entry(committed=True)
         db.session.delete(self)
         db.session.commit()
+        product_cache.invalidate(self.id)
+        if entry is None:
+            catalog_summary.invalidate()
+        else:
+            catalog_summary.remove(*entry)
+
+    def summary_entry(self, committed: bool = False):
+        """Returns the (key, price) this Product counts as in the catalog summary
+
+        :param committed: use the values in the database instead of any
+            changes that have not been committed yet
+
+        :return: ((category, available), price), or None if a value was not loaded
+        :rtype: tuple
+
+        """
+        state = db.inspect(self)
+        values = {}
+        for name in ["category", "available", "price"]:
+            history = state.attrs[name].history
+            if committed and state.persistent:
+                value = (history.deleted or history.unchanged or [None])[0]
+            else:
+                value = (history.added or history.unchanged or [None])[0]
+            if value is None:
+                return None
+            values[name] = value
+        return (values["category"], bool(values["available"])), Decimal(str(values["price"]))
 
     def serialize(self) -> dict:
         """Serializes a Product into a dictionary"""
@@ -123,6 +342,19 @@ class Product(db.Model):
             "category": self.category.name  # convert enum to string
         }
 
+    @staticmethod
+    def serialize_row(row) -> dict:
+        """Serializes a row from Product.rows() into the same dictionary as serialize()"""
+        product_id, name, description, price, available, category = row[:6]
+        return {
+            "id": product_id,
+            "name": name,
+            "description": description,
+            "price": str(price),
+            "available": available,
+            "category": category.name  # convert enum to string
+        }
+
     def deserialize(self, data: dict):
         """
         Deserializes a Product from a dictionary
@@ -130,9 +362,11 @@ class Product(db.Model):
             data (dict): A dictionary containing the Product data
         """
         try:
-            self.name = data["name"]
-            self.description = data["description"]
+            for column in TEXT_COLUMNS:
+                setattr(self, column, _parse_text(column, data[column], self.__table__.c[column].type.length))
             self.price = Decimal(data["price"])
+            if not self.price.is_finite():
+                raise DataValidationError("Invalid price: " + str(data["price"]))
             if isinstance(data["available"], bool):
                 self.available = data["available"]
             else:
@@ -149,25 +383,88 @@ class Product(db.Model):
             raise DataValidationError(
                 "Invalid product: body of request contained bad or no data " + str(error)
             ) from error
+        except InvalidOperation as error:
+            raise DataValidationError(
+                "Invalid price: " + str(data["price"])
+            ) from error
         return self
 
     ##################################################
     # CLASS METHODS
     ##################################################
 
+    @classmethod
+    def create_many(cls, products: list):
+        """
+        Creates many Products in the database in a single transaction
+
+        The rows are sent as multi-row INSERT statements and committed
+        once, instead of one round trip and commit per Product.
+        """
+        logger.info("Creating %s Products", len(products))
+        for product in products:
+            # id must be none to generate next primary key
+            product.id = None
+        entries = [product.summary_entry() for product in products]
+        db.session.add_all(products)
+        db.session.commit()
+        for product in products:
+            product_cache.invalidate(product.id)
+        if None in entries:
+            catalog_summary.invalidate()  # a column default was used
+            return
+        for entry in entries:
+            catalog_summary.add(*entry)
+
+    @classmethod
+    def update_many(cls, query, values: dict) -> int:
+        """
+        Updates every Product matched by a query with one UPDATE statement
+
+        :param query: the query that selects the Products to update
+        :param values: the validated fields to set, from parse_values
+        :return: the number of Products updated
+        """
+        logger.info("Updating many Products with %s", values)
+        count = query.update(values, synchronize_session=False)
+        db.session.commit()
+        product_cache.clear()
+        catalog_summary.invalidate()
+        return count
+
+    @classmethod
+    def delete_many(cls, query) -> int:
+        """
+        Removes every Product matched by a query with one DELETE statement
+
+        :param query: the query that selects the Products to remove
+        :return: the number of Products removed
+        """
+        logger.info("Deleting many Products")
+        count = query.delete(synchronize_session=False)
+        db.session.commit()
+        product_cache.clear()
+        catalog_summary.invalidate()
+        return count
+
     @classmethod
     def init_db(cls, app: Flask):
         """Initializes the database session
 
+        This only binds SQLAlchemy to the app and does not connect to the
+        database. Use `flask db-create` or `flask db-migrate` to create the
+        tables.
+
         :param app: the Flask app
         :type data: Flask
 
         """
         logger.info("Initializing database")
         # This is where we initialize SQLAlchemy from the Flask app
+        product_cache.configure(app.config["PRODUCT_CACHE_SIZE"], app.config["PRODUCT_CACHE_TTL"])
+        catalog_summary.configure(app.config["STATS_CACHE_TTL"])
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
         db.init_app(app)
-        app.app_context().push()
-        db.create_all()  # make our sqlalchemy tables
 
     @classmethod
     def all(cls) -> list:
@@ -175,6 +472,347 @@ class Product(db.Model):
         logger.info("Processing all Products")
         return cls.query.all()
 
+    @classmethod
+    def parse_filters(cls, args: dict) -> dict:
+        """Validates query string arguments into filters for find_by_filters
+
+        Empty and unrecognized arguments are ignored.
+
+        :param args: the query string arguments (e.g. ``request.args``)
+        :type args: dict
+
+        :return: the typed filters keyed by find_by_filters argument name
+        :rtype: dict
+
+        """
+        filters = {}
+        if args.get("q"):
+            filters["q"] = _parse_search(args["q"])
+        if args.get("name"):
+            filters["name"] = args["name"]
+        if args.get("category"):
+            filters["category"] = _parse_category(args["category"])
+        if args.get("available"):
+            filters["available"] = _parse_bool("available", args["available"])
+        for key in ["min_price", "max_price"]:
+            if args.get(key):
+                filters[key] = _parse_price(key, args[key])
+        if "min_price" in filters and "max_price" in filters:
+            if filters["min_price"] > filters["max_price"]:
+                raise DataValidationError("Invalid price range: min_price is above max_price")
+        return filters
+
+    @classmethod
+    def parse_values(cls, data: dict) -> dict:
+        """Validates a partial Product into the columns to set in update_many
+
+        :param data: some of the fields of a serialized Product
+        :type data: dict
+
+        :return: the typed values keyed by column name
+        :rtype: dict
+
+        """
+        if not isinstance(data, dict) or not data:
+            raise DataValidationError("Invalid values: must be a non-empty object")
+        values = {}
+        for key, value in data.items():
+            if key in ["name", "description"] and isinstance(value, str):
+                values[key] = value
+            elif key == "price" and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                values[key] = _parse_price(key, str(value))
+            elif key == "available" and isinstance(value, bool):
+                values[key] = value
+            elif key == "category" and isinstance(value, str):
+                values[key] = _parse_category(value)
+            else:
+                raise DataValidationError(f"Invalid value for {key}: {value!r}")
+        return values
+
+    @classmethod
+    def filter_conditions(  # pylint: disable=too-many-arguments
+        cls,
+        ids: list = None,
+        name: str = None,
+        category: Category = None,
+        available: bool = None,
+        min_price: Decimal = None,
+        max_price: Decimal = None,
+        q: str = None,  # pylint: disable=invalid-name
+    ) -> list:
+        """Returns the SQL conditions that match every one of the given filters
+
+        Filters that are None are not applied. The conditions can be used
+        with both ``Query.filter()`` and ``select().where()``.
+
+        :param ids: the ids of the Products to match
+        :type ids: list
+        :param name: the name of the Products to match
+        :type name: str
+        :param category: the Category of the Products to match
+        :type category: enum
+        :param available: True for products that are available
+        :type available: bool
+        :param min_price: the lowest price to match (inclusive)
+        :type min_price: Decimal
+        :param max_price: the highest price to match (inclusive)
+        :type max_price: Decimal
+        :param q: words that must all appear in the name or description
+        :type q: str
+
+        :return: the conditions to AND together
+        :rtype: list
+
+        """
+        conditions = []
+        if ids is not None:
+            conditions.append(cls.id.in_(ids))
+        if name is not None:
+            conditions.append(cls.name == name)
+        if category is not None:
+            conditions.append(cls.category == category)
+        if available is not None:
+            conditions.append(cls.available == available)
+        if min_price is not None:
+            conditions.append(cls.price >= min_price)
+        if max_price is not None:
+            conditions.append(cls.price <= max_price)
+        if q is not None:
+            conditions.append(SearchMatch(q))
+        return conditions
+
+    @classmethod
+    def find_by_filters(cls, **filters):
+        """Returns all Products matching every one of the given filters
+
+        Takes the same filters as filter_conditions(), so calling this
+        without arguments returns a query for all of the Products.
+
+        :return: a query for the Products that match
+        :rtype: Query
+
+        """
+        logger.info("Processing query for filters %s ...", filters)
+        return cls.query.filter(*cls.filter_conditions(**filters))
+
+    @classmethod
+    def row_columns(cls, keys: list = ()) -> tuple:
+        """Returns the columns of a Product row in the order serialize_row() expects
+
+        Sort keys that are not columns, like the search rank, are added at the end.
+        """
+        extra = tuple(expression.label(name) for name, expression, _ in keys if name not in cls.__table__.columns)
+        return (cls.id, cls.name, cls.description, cls.price, cls.available, cls.category) + extra
+
+    @classmethod
+    def sort_keys(cls, filters: dict, sort: str = None) -> list:
+        """Returns the keys that order a listing ahead of the id
+
+        Searches are ordered by rank, best match first, unless they are
+        sorted some other way. Everything else is ordered by id alone
+        unless it is sorted.
+
+        :param filters: the filters from parse_filters
+        :type filters: dict
+        :param sort: comma separated fields, "-" in front for descending (e.g. ``price,-name``)
+        :type sort: str
+
+        :return: a (name, expression, descending) tuple for each key
+        :rtype: list
+
+        """
+        if not sort:
+            sort = "-rank" if filters.get("q") else ""
+        keys = []
+        for field in [field.strip() for field in sort.split(",") if field.strip()]:
+            descending = field.startswith("-")
+            name = field[1:] if descending else field
+            if name == "rank" and filters.get("q"):
+                expression = SearchRank(filters["q"])
+            elif name in SORT_FIELDS:
+                expression = getattr(cls, name)
+            else:
+                raise DataValidationError(f"Invalid sort: '{field}'")
+            if name in [key[0] for key in keys]:
+                raise DataValidationError(f"Invalid sort: '{name}' is used more than once")
+            keys.append((name, expression, descending))
+        return keys
+
+    @classmethod
+    def rows(cls, query, keys: list = ()):
+        """Returns a query for the plain column tuples of the Products in a query
+
+        The rows are not hydrated into Product instances or tracked by the
+        session, which makes them much cheaper for read-only listings.
+        Use serialize_row() to turn them into dictionaries.
+
+        :param query: a query for Products, e.g. from find_by_filters
+        :type query: Query
+        :param keys: sort keys from sort_keys, any that are not columns are added to the rows
+        :type keys: list
+
+        :return: a query for (id, name, description, price, available, category)
+        :rtype: Query
+
+        """
+        return query.with_entities(*cls.row_columns(keys))
+
+    @classmethod
+    def _key_columns(cls, keys: list) -> list:
+        """Returns (expression, descending) for the sort keys and the id that breaks ties"""
+        columns = [(expression, descending) for _, expression, descending in keys]
+        # ties go the same way as the keys when they all do, so one index scan serves the page
+        descending = bool(keys) and all(descending for _, descending in columns)
+        return columns + [(cls.id, descending)]
+
+    @classmethod
+    def order(cls, query, keys: list = ()):
+        """Orders a query or select() by the sort keys and then by id"""
+        return query.order_by(
+            *(expression.desc() if descending else expression for expression, descending in cls._key_columns(keys))
+        )
+
+    @classmethod
+    def cursor_keys(cls, row, keys: list) -> dict:
+        """Returns the sort key values of a row in a form a cursor can hold
+
+        They are keyed by the sort field, with a - when it is descending, so
+        a cursor cannot be used with another sort order.
+        """
+        values = {}
+        for name, _, descending in keys:
+            value = getattr(row, name)
+            if isinstance(value, Decimal):
+                value = str(value)
+            elif isinstance(value, Enum):
+                value = value.name
+            values[f"-{name}" if descending else name] = value
+        return values
+
+    @classmethod
+    def seek(cls, query, keys: list, after_id: int, after_keys: dict):
+        """Restricts an ordered query or select() to the rows after a cursor
+
+        :param keys: the sort keys from sort_keys the query is ordered by
+        :param after_id: the id from the cursor
+        :param after_keys: the sort key values from the cursor, see cursor_keys
+        """
+        fields = [f"-{name}" if descending else name for name, _, descending in keys]
+        if list(after_keys or {}) != fields:
+            raise DataValidationError("Invalid cursor: it does not match the sort order")
+        columns = cls._key_columns(keys)
+        values = [_parse_cursor_key(name, after_keys[field]) for (name, _, _), field in zip(keys, fields)]
+        values.append(after_id)
+        # bound with the type of their key, so an Enum is converted and a boolean can be compared
+        values = [literal(value, type_=expression.type) for (expression, _), value in zip(columns, values)]
+        if len({descending for _, descending in columns}) == 1:
+            # a row value comparison is a single range condition on the index
+            row = tuple_(*(expression for expression, _ in columns))
+            descending = columns[0][1]
+            return query.where(row < tuple_(*values) if descending else row > tuple_(*values))
+        # (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... with < for descending keys
+        conditions = []
+        for position, (expression, descending) in enumerate(columns):
+            ahead = expression < values[position] if descending else expression > values[position]
+            equal = [column == value for (column, _), value in zip(columns[:position], values)]
+            conditions.append(and_(*equal, ahead))
+        return query.where(or_(*conditions))
+
+    @classmethod
+    def paginate(  # pylint: disable=too-many-arguments
+        cls, query, limit: int, after_id: int = None, keys: list = (), after_keys: dict = None
+    ) -> tuple:
+        """Returns one page of a query using keyset pagination on the id
+
+        The page is fetched with an index seek on the primary key
+        (``WHERE id > after_id ORDER BY id LIMIT n``) so deep pages cost
+        the same as the first one. With sort keys the page is ordered by
+        them first and the id breaks ties.
+
+        :param query: the query to take a page from
+        :type query: Query
+        :param limit: the maximum number of Products in the page
+        :type limit: int
+        :param after_id: only return Products after the one with this id
+        :type after_id: int
+        :param keys: the sort keys from sort_keys
+        :type keys: list
+        :param after_keys: the sort key values of the Product with after_id
+        :type after_keys: dict
+
+        :return: the Products in the page and the id to continue after,
+            or None if this is the last page
+        :rtype: tuple
+
+        """
+        logger.info("Processing page of %s after id %s ...", limit, after_id)
+        if after_id is not None:
+            query = cls.seek(query, keys, after_id, after_keys)
+        # fetch one extra row to find out if there is a next page
+        products = cls.order(query, keys).limit(limit + 1).all()
+        if len(products) > limit:
+            return products[:limit], products[limit - 1].id
+        return products, None
+
+    @classmethod
+    def aggregate(cls) -> tuple:
+        """Reads the price statistics of the catalog with grouped SQL
+
+        :return: (count, min, max, sum) keyed by (category, available),
+            and the price percentiles of the whole catalog
+        :rtype: tuple
+
+        """
+        logger.info("Processing catalog statistics ...")
+        rows = (
+            db.session.query(
+                cls.category, cls.available,
+                # pylint: disable=not-callable
+                func.count(cls.id), func.min(cls.price), func.max(cls.price), func.sum(cls.price),
+            )
+            .group_by(cls.category, cls.available)
+            .all()
+        )
+        groups = {(category, available): values for category, available, *values in rows}
+        count = sum(group[0] for group in groups.values())
+        percentiles = {}
+        for percentile in PERCENTILES if count else ():
+            # nearest rank, read from the price index
+            offset = max(math.ceil(percentile * count / 100) - 1, 0)
+            percentiles[percentile] = (
+                db.session.query(cls.price).order_by(cls.price, cls.id).offset(offset).limit(1).scalar()
+            )
+        return groups, percentiles
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Returns the counts and prices of the Products by category and availability
+
+        The answer comes from the catalog summary, which is only read from
+        the database when it is missing, stale or expired. The percentiles
+        are from that read, the rest includes every write since.
+
+        :return: the statistics of the whole catalog and of each category
+        :rtype: dict
+
+        """
+        snapshot = catalog_summary.snapshot()
+        if snapshot is None:
+            version = catalog_summary.version
+            snapshot = cls.aggregate()
+            catalog_summary.load(*snapshot, version=version)
+        groups, percentiles = snapshot
+        categories = {}
+        for category in Category:
+            matches = [group for (key, _), group in groups.items() if key == category]
+            available = [group for (key, flag), group in groups.items() if key == category and flag]
+            categories[category.name] = _group_stats(matches, available)
+        result = _group_stats(list(groups.values()), [group for (_, flag), group in groups.items() if flag])
+        for percentile, price in percentiles.items():
+            result["price"][f"p{percentile}"] = str(price)
+        result["categories"] = categories
+        return result
+
     @classmethod
     def find(cls, product_id: int):
         """Finds a Product by it's ID
@@ -189,6 +827,31 @@ class Product(db.Model):
         logger.info("Processing lookup for id %s ...", product_id)
         return cls.query.get(product_id)
 
+    @classmethod
+    def find_serialized(cls, product_id: int):
+        """Finds a Product by it's ID and returns it serialized
+
+        Reads through the product cache, so repeated lookups of the same
+        Product do not touch the database until it is written or expires.
+
+        :param product_id: the id of the Product to find
+        :type product_id: int
+
+        :return: the serialized Product with the product_id, or None if not found
+        :rtype: dict
+
+        """
+        data = product_cache.get(product_id)
+        if data is None:
+            # a write that commits while this reads invalidates the generation
+            generation = product_cache.generation(product_id)
+            product = cls.find(product_id)
+            if not product:
+                return None
+            data = product.serialize()
+            product_cache.set(product_id, data, generation)
+        return data
+
     @classmethod
     def find_by_name(cls, name: str) -> list:
         """Returns all Products with the given name
@@ -247,3 +910,20 @@ class Product(db.Model):
         """
         logger.info("Processing category query for %s ...", category.name)
         return cls.query.filter(cls.category == category)
+
+
+######################################################################
+#  S E A R C H   I N D E X   D D L
+######################################################################
+@event.listens_for(Product.__table__, "after_create")
+def _create_search_index(_table, connection, **_kw):
+    """Creates the full text search index along with the product table"""
+    for statement in search_index_ddl(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+@event.listens_for(Product.__table__, "before_drop")
+def _drop_search_index(_table, connection, **_kw):
+    """Drops the SQLite FTS5 table, PostgreSQL drops its index with the table"""
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS product_search"))
@@ -18,29 +18,54 @@
 """
 Product Store Service with UI
 """
-from flask import jsonify, request, abort
+import io
+import csv
+import zlib
+import hashlib
+from flask import Blueprint, Response, current_app, jsonify, request, abort, stream_with_context
 from flask import url_for  # noqa: F401 pylint: disable=unused-import
-from service.models import Product, Category
+from service.models import Product, DataValidationError, db, product_cache
+from service.models import COLUMNS, encode_cursor, decode_cursor
 from service.common import status  # HTTP Status Codes
-from . import app
+from service.common.pool_stats import pool_stats
+from service.common.importer import FORMATS, ProductImporter, read_records
+
+bp = Blueprint("products", __name__)
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
 
 ######################################################################
 # H E A L T H   C H E C K
 ######################################################################
-@app.route("/health")
+@bp.route("/health")
 def healthcheck():
     """Let them know our heart is still beating"""
     return jsonify(status=200, message="OK"), status.HTTP_200_OK
 
 
+######################################################################
+# I N T E R N A L   S T A T I S T I C S
+######################################################################
+@bp.route("/internal/cache")
+def cache_stats():
+    """Returns the product cache counters used to size it"""
+    return jsonify(product_cache.stats()), status.HTTP_200_OK
+
+
+@bp.route("/internal/pool")
+def database_pool_stats():
+    """Returns the database connection pool state and checkout wait times"""
+    return jsonify(pool_stats(db.engine)), status.HTTP_200_OK
+
+
 ######################################################################
 # H O M E   P A G E
 ######################################################################
-@app.route("/")
+@bp.route("/")
 def index():
     """Base URL for our service"""
-    return app.send_static_file("index.html")
+    return current_app.send_static_file("index.html")
 
 
 ######################################################################
@@ -49,7 +74,7 @@ def index():
 def check_content_type(content_type):
     """Checks that the media type is correct"""
     if "Content-Type" not in request.headers:
-        app.logger.error("No Content-Type specified.")
+        current_app.logger.error("No Content-Type specified.")
         abort(
             status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             f"Content-Type must be {content_type}",
@@ -58,31 +83,149 @@ def check_content_type(content_type):
     if request.headers["Content-Type"] == content_type:
         return
 
-    app.logger.error("Invalid Content-Type: %s", request.headers["Content-Type"])
+    current_app.logger.error("Invalid Content-Type: %s", request.headers["Content-Type"])
     abort(
         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
         f"Content-Type must be {content_type}",
     )
 
 
+def compute_etag(data) -> str:
+    """Returns a strong ETag that changes whenever the serialized data does"""
+    return hash_body(current_app.json.dumps(data))
+
+
+def hash_body(body: str) -> str:
+    """Returns the ETag of a response body"""
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def conditional_response(data, headers: dict = None):
+    """Returns the data with its ETag, or 304 Not Modified if the client has it
+
+    The data is encoded once, with the app's JSON provider, and the ETag
+    is the hash of that body.
+    """
+    body = current_app.json.dumps(data)
+    etag = hash_body(body)
+    headers = dict(headers or {})
+    headers["ETag"] = f'"{etag}"'
+    # clients must revalidate, which is cheap because of the ETag
+    headers["Cache-Control"] = "no-cache"
+    # If-None-Match uses the weak comparison, so ETags a proxy marked weak (W/"...") still match
+    if request.if_none_match.contains_weak(etag):
+        return "", status.HTTP_304_NOT_MODIFIED, headers
+    return current_app.response_class(body, status.HTTP_200_OK, headers, mimetype="application/json")
+
+
+def parse_ids(ids) -> list:
+    """Validates a list of Product ids, or a comma separated string of them"""
+    if isinstance(ids, str):
+        ids = [value.strip() for value in ids.split(",") if value.strip()]
+        if not all(value.isascii() and value.isdecimal() for value in ids):
+            abort(status.HTTP_400_BAD_REQUEST, "ids must be a comma separated list of integers")
+        return [int(value) for value in ids]
+    if not isinstance(ids, list) or not all(
+        isinstance(value, int) and not isinstance(value, bool) for value in ids
+    ):
+        abort(status.HTTP_400_BAD_REQUEST, "ids must be a list of integers")
+    return ids
+
+
+def get_page_limit():
+    """Returns the page size requested with ?limit= or None if not paginating"""
+    limit = request.args.get("limit")
+    if limit is None:
+        if "next" not in request.args:
+            return None
+        return current_app.config["PAGE_SIZE_DEFAULT"]
+    if not (limit.isascii() and limit.isdecimal()) or int(limit) < 1:
+        abort(status.HTTP_400_BAD_REQUEST, f"Invalid limit: '{limit}'")
+    return min(int(limit), current_app.config["PAGE_SIZE_MAX"])
+
+
+def stream_products(rows):
+    """Writes a query of Product rows out as a JSON array a batch at a time
+
+    Rows are pulled with ``yield_per`` so only one batch of Products is
+    held in memory, and each batch is sent as soon as it is serialized.
+    """
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+    count = 0
+    chunk = ["["]
+    for row in rows.yield_per(batch_size):
+        if count:
+            chunk.append(",")
+        chunk.append(current_app.json.dumps(Product.serialize_row(row)))
+        count += 1
+        if count % batch_size == 0:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk)
+    current_app.logger.info("[%s] Products streamed", count)
+
+
+def export_products(rows, file_format: str):
+    """Writes a query of Product rows out as NDJSON or CSV a batch at a time
+
+    The CSV has a header row and the same columns that /products:import
+    reads, so an export can be imported again.
+    """
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == "csv":
+        writer.writerow(("id",) + COLUMNS)
+    count = 0
+    for row in rows.yield_per(batch_size):
+        product = Product.serialize_row(row)
+        if file_format == "csv":
+            product["available"] = "true" if product["available"] else "false"
+            writer.writerow(product.values())
+        else:
+            buffer.write(current_app.json.dumps(product))
+            buffer.write("\n")
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+    current_app.logger.info("[%s] Products exported", count)
+
+
+def gzip_chunks(chunks):
+    """Compresses a stream of text chunks as they are produced
+
+    Every chunk is flushed so the client receives a steady stream instead
+    of waiting for the compressor to fill its buffer.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 writes a gzip header
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
 ######################################################################
 # C R E A T E   A   N E W   P R O D U C T
 ######################################################################
-@app.route("/products", methods=["POST"])
+@bp.route("/products", methods=["POST"])
 def create_products():
     """
     Creates a Product
     This endpoint will create a Product based the data in the body that is posted
     """
-    app.logger.info("Request to Create a Product...")
+    current_app.logger.info("Request to Create a Product...")
     check_content_type("application/json")
 
     data = request.get_json()
-    app.logger.info("Processing: %s", data)
+    # the payload is only formatted when DEBUG is on, and then on the log thread
+    current_app.logger.debug("Processing: %s", data)
     product = Product()
     product.deserialize(data)
     product.create()
-    app.logger.info("Product with new id [%s] saved!", product.id)
+    current_app.logger.info("Product with new id [%s] saved!", product.id)
 
     message = product.serialize()
 
@@ -94,6 +237,90 @@ def create_products():
     return jsonify(message), status.HTTP_201_CREATED, {"Location": location_url}
 
 
+######################################################################
+# C R E A T E   A   B A T C H   O F   P R O D U C T S
+######################################################################
+@bp.route("/products:batch", methods=["POST"])
+def create_products_batch():
+    """
+    Creates a batch of Products
+    This endpoint will create every valid Product in the JSON array that is
+    posted in one transaction, and report the ones that are not valid
+    """
+    current_app.logger.info("Request to Create a batch of Products...")
+    check_content_type("application/json")
+
+    data = request.get_json()
+    if not isinstance(data, list) or not data:
+        abort(status.HTTP_400_BAD_REQUEST, "Body must be a non-empty JSON array of products")
+    if len(data) > current_app.config["BATCH_SIZE_MAX"]:
+        abort(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Batch of {len(data)} products exceeds the limit of {current_app.config['BATCH_SIZE_MAX']}",
+        )
+    current_app.logger.info("Processing batch of %s products", len(data))
+
+    products = {}
+    errors = []
+    for position, item in enumerate(data):
+        try:
+            products[position] = Product().deserialize(item)
+        except DataValidationError as error:
+            errors.append({"index": position, "message": str(error)})
+    if products:
+        Product.create_many(list(products.values()))
+    current_app.logger.info("[%s] Products created, [%s] rejected", len(products), len(errors))
+
+    message = {
+        "ids": [products[position].id if position in products else None for position in range(len(data))],
+        "errors": errors,
+    }
+    if not products:
+        return message, status.HTTP_400_BAD_REQUEST
+    if errors:
+        return message, status.HTTP_207_MULTI_STATUS
+    return message, status.HTTP_201_CREATED
+
+
+######################################################################
+# I M P O R T   P R O D U C T S
+######################################################################
+@bp.route("/products:import", methods=["POST"])
+def import_products():
+    """
+    Imports Products from a CSV or NDJSON upload
+
+    This endpoint will read the body a line at a time, validate every record
+    like create_products and insert them in batched transactions, reporting
+    the lines that are not valid. With ?upsert=true records that have an id
+    update that Product instead.
+    """
+    current_app.logger.info("Request to Import Products...")
+    file_format = FORMATS.get(request.mimetype)
+    if file_format is None:
+        current_app.logger.error("Invalid Content-Type: %s", request.headers.get("Content-Type"))
+        abort(
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            f"Content-Type must be one of {', '.join(FORMATS)}",
+        )
+    upsert = request.args.get("upsert", "").lower() in ["true", "yes", "1"]
+
+    # utf-8-sig skips the byte order mark that Excel writes at the start of a CSV
+    lines = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+    importer = ProductImporter(
+        batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+        upsert=upsert,
+        errors_max=current_app.config["IMPORT_ERRORS_MAX"],
+    )
+    message = importer.run(read_records(lines, file_format))
+
+    if importer.error_count and not importer.created + importer.updated:
+        return message, status.HTTP_400_BAD_REQUEST
+    if importer.error_count:
+        return message, status.HTTP_207_MULTI_STATUS
+    return message, status.HTTP_200_OK
+
+
 ######################################################################
 # L I S T   A L L   P R O D U C T S
 ######################################################################
@@ -101,36 +328,102 @@ def create_products():
 ######################################################################
 # LIST PRODUCTS
 ######################################################################
-@app.route("/products", methods=["GET"])
+@bp.route("/products", methods=["GET"])
 def list_products():
-    """Returns a list of Products"""
-    app.logger.info("Request to list Products...")
-
-    products = []
-    name = request.args.get("name")
-    category = request.args.get("category")
-    available = request.args.get("available")
-
-    if name:
-        app.logger.info("Find by name: %s", name)
-        products = Product.find_by_name(name)
-    elif category:
-        app.logger.info("Find by category: %s", category)
-        # create enum from string
-        category_value = getattr(Category, category.upper())
-        products = Product.find_by_category(category_value)
-    elif available:
-        app.logger.info("Find by available: %s", available)
-        # create bool from string
-        available_value = available.lower() in ["true", "yes", "1"]
-        products = Product.find_by_availability(available_value)
+    """Returns a list of Products
+
+    ?q= searches the name and description and orders the Products by rank
+    ?sort= orders them by a list of fields, e.g. price,-name
+    """
+    current_app.logger.info("Request to list Products...")
+
+    filters = Product.parse_filters(request.args)
+    limit = get_page_limit()
+    stream = request.args.get("stream", "").lower() in ["true", "yes", "1"]
+
+    current_app.logger.info("Find by filters: %s", filters)
+    products = Product.find_by_filters(**filters)
+
+    headers = {}
+    keys = Product.sort_keys(filters, request.args.get("sort"))
+    rows = Product.rows(products, keys)
+    if limit:
+        after_id, after_keys = None, {}
+        if "next" in request.args:
+            after_id, after_keys = decode_cursor(request.args["next"])
+        rows, last_id = Product.paginate(rows, limit, after_id, keys, after_keys)
+        if last_id is not None:
+            args = request.args.to_dict()
+            cursor = encode_cursor(last_id, Product.cursor_keys(rows[-1], keys))
+            args.update(limit=limit, next=cursor)
+            next_url = url_for(".list_products", _external=True, **args)
+            headers["Link"] = f'<{next_url}>; rel="next"'
     else:
-        app.logger.info("Find all")
-        products = Product.all()
+        rows = Product.order(rows, keys)
+        if stream:
+            return Response(
+                stream_with_context(stream_products(rows)),
+                status=status.HTTP_200_OK,
+                mimetype="application/json",
+            )
+
+    results = [Product.serialize_row(row) for row in rows]
+    current_app.logger.info("[%s] Products returned", len(results))
+    return conditional_response(results, headers)
+
+
+######################################################################
+# E X P O R T   P R O D U C T S
+######################################################################
+@bp.route("/products/export", methods=["GET"])
+def export_catalog():
+    """Exports Products as NDJSON or CSV
+
+    ?format= is ndjson (the default) or csv, and the same filters and
+    ?sort= as list_products select and order the Products. The rows are
+    streamed from a server-side cursor, and gzip compressed when the
+    client accepts it.
+    """
+    current_app.logger.info("Request to Export Products...")
+    file_format = request.args.get("format", "ndjson").lower()
+    if file_format not in EXPORT_MIMETYPES:
+        abort(status.HTTP_400_BAD_REQUEST, f"Invalid format: '{file_format}', use csv or ndjson")
+
+    filters = Product.parse_filters(request.args)
+    keys = Product.sort_keys(filters, request.args.get("sort"))
+    rows = Product.order(Product.rows(Product.find_by_filters(**filters), keys), keys)
+
+    chunks = export_products(rows, file_format)
+    headers = {
+        "Content-Disposition": f"attachment; filename=products.{file_format}",
+        "Vary": "Accept-Encoding",
+    }
+    if request.accept_encodings["gzip"]:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(
+        stream_with_context(chunks),
+        status=status.HTTP_200_OK,
+        mimetype=EXPORT_MIMETYPES[file_format],
+        headers=headers,
+    )
+
+
+######################################################################
+# C A T A L O G   S T A T I S T I C S
+######################################################################
+@bp.route("/products/stats", methods=["GET"])
+def product_stats():
+    """
+    Returns the catalog statistics
+
+    This endpoint will return the Product counts and prices by category
+    and availability from the cached catalog summary
+    """
+    current_app.logger.info("Request for the catalog statistics")
+    return conditional_response(Product.stats())
+
 
-    results = [product.serialize() for product in products]
-    app.logger.info("[%s] Products returned", len(results))
-    return results, status.HTTP_200_OK
 ######################################################################
 # R E A D   A   P R O D U C T
 ######################################################################
@@ -138,21 +431,21 @@ def list_products():
 ######################################################################
 # READ A PRODUCT
 ######################################################################
-@app.route("/products/<int:product_id>", methods=["GET"])
+@bp.route("/products/<int:product_id>", methods=["GET"])
 def get_products(product_id):
     """
     Retrieve a single Product
 
     This endpoint will return a Product based on it's id
     """
-    app.logger.info("Request to Retrieve a product with id [%s]", product_id)
+    current_app.logger.info("Request to Retrieve a product with id [%s]", product_id)
 
-    product = Product.find(product_id)
+    product = Product.find_serialized(product_id)
     if not product:
         abort(status.HTTP_404_NOT_FOUND, f"Product with id '{product_id}' was not found.")
 
-    app.logger.info("Returning product: %s", product.name)
-    return product.serialize(), status.HTTP_200_OK
+    current_app.logger.info("Returning product: %s", product["name"])
+    return conditional_response(product)
 
 
 ######################################################################
@@ -162,30 +455,104 @@ def get_products(product_id):
 ######################################################################
 # UPDATE AN EXISTING PRODUCT
 ######################################################################
-@app.route("/products/<int:product_id>", methods=["PUT"])
+@bp.route("/products/<int:product_id>", methods=["PUT"])
 def update_products(product_id):
     """
     Update a Product
 
     This endpoint will update a Product based the body that is posted
     """
-    app.logger.info("Request to Update a product with id [%s]", product_id)
+    current_app.logger.info("Request to Update a product with id [%s]", product_id)
     check_content_type("application/json")
 
     product = Product.find(product_id)
     if not product:
         abort(status.HTTP_404_NOT_FOUND, f"Product with id '{product_id}' was not found.")
 
-    product.deserialize(request.get_json())
-    product.id = product_id
-    product.update()
-    return product.serialize(), status.HTTP_200_OK
+    if request.if_match:
+        # If-Match makes the update conditional to avoid losing other updates.
+        # The UPDATE is conditional too, in case another one commits first.
+        changes = Product().deserialize(request.get_json())
+        if compute_etag(product.serialize()) not in request.if_match or not product.update_if_unchanged(changes):
+            abort(
+                status.HTTP_412_PRECONDITION_FAILED,
+                f"Product with id '{product_id}' was changed by another request.",
+            )
+    else:
+        product.deserialize(request.get_json())
+        product.id = product_id
+        product.update()
+    message = product.serialize()
+    return message, status.HTTP_200_OK, {"ETag": f'"{compute_etag(message)}"'}
+
+
+######################################################################
+# U P D A T E   M A N Y   P R O D U C T S
+######################################################################
+@bp.route("/products", methods=["PATCH"])
+def update_many_products():
+    """
+    Update many Products
+
+    This endpoint will set the fields in "values" on every Product selected
+    by a list of "ids" and/or "filters" with a single UPDATE statement
+    """
+    current_app.logger.info("Request to Update many Products")
+    check_content_type("application/json")
+
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get("filters", {}), dict):
+        abort(status.HTTP_400_BAD_REQUEST, "Body must be an object with values and ids or filters")
+    values = Product.parse_values(data.get("values"))
+    ids = parse_ids(data["ids"]) if "ids" in data else None
+    filters = Product.parse_filters(
+        {key: str(value) for key, value in data.get("filters", {}).items()}
+    )
+    if ids is None and not filters:
+        abort(status.HTTP_400_BAD_REQUEST, "ids or filters are required to select the Products")
+
+    count = Product.update_many(Product.find_by_filters(ids=ids, **filters), values)
+    current_app.logger.info("[%s] Products updated", count)
+    return {"count": count}, status.HTTP_200_OK
+
 
 ######################################################################
 # D E L E T E   A   P R O D U C T
 ######################################################################
+@bp.route("/products/<int:product_id>", methods=["DELETE"])
+def delete_products(product_id):
+    """
+    Delete a Product
 
+    This endpoint will delete a Product based the id specified in the path
+    """
+    current_app.logger.info("Request to Delete a product with id [%s]", product_id)
 
-#
-# PLACE YOUR CODE TO DELETE A PRODUCT HERE
-#
+    product = Product.find(product_id)
+    if product:
+        product.delete()
+
+    return "", status.HTTP_204_NO_CONTENT
+
+
+######################################################################
+# D E L E T E   M A N Y   P R O D U C T S
+######################################################################
+@bp.route("/products", methods=["DELETE"])
+def delete_many_products():
+    """
+    Delete many Products
+
+    This endpoint will delete every Product selected by ?ids= and/or the
+    same filters as list_products with a single DELETE statement
+    """
+    current_app.logger.info("Request to Delete many Products")
+
+    ids = parse_ids(request.args["ids"]) if "ids" in request.args else None
+    filters = Product.parse_filters(request.args)
+    if ids is None and not filters:
+        abort(status.HTTP_400_BAD_REQUEST, "ids or filters are required to select the Products")
+
+    count = Product.delete_many(Product.find_by_filters(ids=ids, **filters))
+    current_app.logger.info("[%s] Products deleted", count)
+    return {"count": count}, status.HTTP_200_OK
@@ -0,0 +1,10 @@
+"""
+Benchmarks for the model and route hot paths
+
+These are not unit tests and are not collected by the test runner. Run
+them with:
+    python -m tests.benchmarks --sizes 1000,100000 --output benchmark.json
+
+and compare a later run against saved results with:
+    python -m tests.benchmarks --baseline benchmark.json
+"""
@@ -0,0 +1,44 @@
+"""
+Runs the benchmarks from the command line
+
+    python -m tests.benchmarks --help
+"""
+import os
+import sys
+import argparse
+import tempfile
+from tests.benchmarks import runner, suite
+
+
+def main(argv: list = None) -> int:
+    """Runs the benchmarks and returns 1 if any regressed from the baseline"""
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks", description=__doc__)
+    parser.add_argument("--sizes", default="1000", help="catalog sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--database-uri", default=os.getenv("BENCHMARK_DATABASE_URI"),
+                        help="database to populate, ITS PRODUCT TABLE IS DROPPED (default: a temporary SQLite file)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls of each benchmark")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the generated products")
+    parser.add_argument("--only", help="run only the benchmarks whose names contain this")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = args.database_uri or f"sqlite:///{directory}/benchmark.db"
+        results = suite.run(database_uri, sizes, args.repeat, args.seed, args.only)
+
+    comparison = None
+    if args.baseline:
+        comparison = runner.compare(results, runner.load(args.baseline), args.threshold)
+    print(runner.report(results, comparison))
+    if args.output:
+        runner.save(args.output, runner.metadata(database_uri), results)
+    if comparison and any(row["regression"] for row in comparison):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Benchmark Runner
+
+Times functions, saves the results as JSON and compares them with a
+baseline run
+"""
+import json
+import time
+import platform
+import statistics
+from datetime import datetime, timezone
+import sqlalchemy
+
+
+def measure(function, repeat: int = 5, warmup: int = 1, setup=None) -> dict:
+    """Calls a function repeatedly and returns its timings in milliseconds
+
+    :param setup: called before every call without being timed
+    """
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(timings[0], 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+    }
+
+
+def metadata(database_uri: str) -> dict:
+    """Describes where the benchmarks ran so results are only compared like for like"""
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "database": database_uri.split(":", 1)[0],
+    }
+
+
+def save(path: str, meta: dict, results: list):
+    """Writes the results to a JSON file"""
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump({"meta": meta, "results": results}, output, indent=2)
+
+
+def load(path: str) -> list:
+    """Reads the results from a JSON file"""
+    with open(path, encoding="utf-8") as baseline:
+        return json.load(baseline)["results"]
+
+
+def compare(results: list, baseline: list, threshold: float = 0.2) -> list:
+    """Compares the median times of each benchmark with the baseline
+
+    :param threshold: how much slower a benchmark may get, 0.2 is 20%
+    :return: one row per benchmark in both runs, regressions are flagged
+    """
+    before = {(result["name"], result["rows"]): result for result in baseline}
+    rows = []
+    for result in results:
+        old = before.get((result["name"], result["rows"]))
+        if old is None:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else 1.0
+        rows.append({
+            "name": result["name"],
+            "rows": result["rows"],
+            "baseline_ms": old["median_ms"],
+            "median_ms": result["median_ms"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def report(results: list, comparison: list = None) -> str:
+    """Formats the results, and the comparison if there is one, as a table"""
+    lines = [f"{'benchmark':<44} {'rows':>9} {'median ms':>11} {'p95 ms':>10}"]
+    for result in results:
+        lines.append(
+            f"{result['name']:<44} {result['rows']:>9} {result['median_ms']:>11.3f} {result['p95_ms']:>10.3f}"
+        )
+    if comparison:
+        lines += ["", f"{'benchmark':<44} {'rows':>9} {'baseline':>11} {'now':>10} {'ratio':>7}"]
+        for row in comparison:
+            flag = "  REGRESSION" if row["regression"] else ""
+            lines.append(
+                f"{row['name']:<44} {row['rows']:>9} {row['baseline_ms']:>11.3f} "
+                f"{row['median_ms']:>10.3f} {row['ratio']:>7.2f}{flag}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+"""
+Benchmark Suite
+
+Populates a catalog with ProductFactory and times the Product model and
+the routes through the Flask test client
+"""
+import logging
+import factory.random
+from sqlalchemy import insert, text
+from service import create_app
+from service.models import db, Product
+from tests.benchmarks.runner import measure
+from tests.factories import ProductFactory
+
+# Products built and inserted per statement while populating
+POPULATE_BATCH_SIZE = 10000
+
+
+def populate(rows: int, seed: int):
+    """Fills the product table with rows built by ProductFactory"""
+    factory.random.reseed_random(seed)
+    db.drop_all()
+    db.create_all()
+    for start in range(0, rows, POPULATE_BATCH_SIZE):
+        products = ProductFactory.build_batch(min(POPULATE_BATCH_SIZE, rows - start))
+        db.session.execute(insert(Product), [
+            {
+                "name": product.name,
+                "description": product.description,
+                "price": product.price,
+                "available": product.available,
+                "category": product.category,
+            }
+            for product in products
+        ])
+        db.session.commit()
+    # give the query planner statistics about the new rows
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def model_cases(sample: Product) -> dict:
+    """Returns the Product model benchmarks, keyed by name"""
+    data = sample.serialize()
+    return {
+        "Product.serialize": lambda: sample.serialize(),  # pylint: disable=unnecessary-lambda
+        "Product.deserialize": lambda: Product().deserialize(data),
+        "Product.find": lambda: Product.find(sample.id),
+        "Product.find_by_name": lambda: Product.find_by_name(sample.name).all(),
+        "Product.find_by_price": lambda: Product.find_by_price(sample.price).all(),
+        "Product.find_by_availability": lambda: Product.find_by_availability(sample.available).all(),
+        "Product.find_by_category": lambda: Product.find_by_category(sample.category).all(),
+        # the whole catalog as ORM instances and as plain rows, the listings use the rows
+        "Product.all + serialize": lambda: [product.serialize() for product in Product.all()],
+        "Product.rows + serialize_row": lambda: [
+            Product.serialize_row(row) for row in Product.rows(Product.query)
+        ],
+    }
+
+
+def route_cases(client, sample: Product) -> dict:
+    """Returns the route benchmarks, keyed by name"""
+    data = sample.serialize()
+
+    def call(method, url, **kwargs):
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code == 200, f"{method} {url} returned {response.status_code}"
+
+    return {
+        "GET /products?limit=100": lambda: call("GET", "/products?limit=100"),
+        "GET /products?category&available&limit=100": lambda: call(
+            "GET", f"/products?category={sample.category.name}&available=true&limit=100"
+        ),
+        "GET /products/<id>": lambda: call("GET", f"/products/{sample.id}"),
+        "PUT /products/<id>": lambda: call("PUT", f"/products/{sample.id}", json=data),
+    }
+
+
+def run(database_uri: str, sizes: list, repeat: int = 5, seed: int = 42, only: str = None) -> list:
+    """Runs every benchmark against a catalog of each size
+
+    :param database_uri: the database to populate, its product table is dropped
+    :param sizes: the numbers of Products to populate the catalog with
+    :param only: run only the benchmarks whose names contain this
+    :return: the timings of each benchmark for each size
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_uri,
+        "LOGGING_LEVEL": logging.WARNING,
+        "PRODUCT_CACHE_SIZE": 0,  # time the database, not the cache
+    })
+    results = []
+    with app.app_context():
+        for rows in sizes:
+            populate(rows, seed)
+            sample = Product.query.order_by(Product.id).first()
+            cases = dict(model_cases(sample), **route_cases(app.test_client(), sample))
+            for name, function in cases.items():
+                if only and only not in name:
+                    continue
+                # a new session for every call so nothing is read from the identity map
+                results.append({"name": name, "rows": rows, **measure(function, repeat, setup=db.session.remove)})
+    return results
@@ -19,7 +19,8 @@ Test Factory to make fake objects for testing
 """
 import factory
 from factory.fuzzy import FuzzyChoice, FuzzyDecimal
-from service.models import Product, Category
+from service.models import Product
+from service.common.seeding import PRODUCT_CATEGORIES, PRODUCT_NAMES, PRICE_RANGE
 
 
 class ProductFactory(factory.Factory):
@@ -31,31 +32,8 @@ class ProductFactory(factory.Factory):
         model = Product
 
     id = factory.Sequence(lambda n: n)
-    name = FuzzyChoice(
-        choices=[
-            "Hat",
-            "Pants",
-            "Shirt",
-            "Apple",
-            "Banana",
-            "Pots",
-            "Towels",
-            "Ford",
-            "Chevy",
-            "Hammer",
-            "Wrench"
-        ]
-    )
+    name = FuzzyChoice(choices=PRODUCT_NAMES)
     description = factory.Faker("text")
-    price = FuzzyDecimal(0.5, 2000.0, 2)
+    price = FuzzyDecimal(*PRICE_RANGE, 2)
     available = FuzzyChoice(choices=[True, False])
-    category = FuzzyChoice(
-        choices=[
-            Category.UNKNOWN,
-            Category.CLOTHS,
-            Category.FOOD,
-            Category.HOUSEWARES,
-            Category.AUTOMOTIVE,
-            Category.TOOLS,
-        ]
-    ) 
+    category = FuzzyChoice(choices=PRODUCT_CATEGORIES)
@@ -0,0 +1,63 @@
+"""
+Test cases for the App Factory
+"""
+import os
+import sys
+import subprocess
+from unittest import TestCase
+from service import create_app
+from service.common import status
+from service.models import db
+
+# Seconds a fresh interpreter may take to import the service and create the app
+BOOT_TIME_BUDGET = float(os.getenv("BOOT_TIME_BUDGET", "3.0"))
+
+BOOT_SCRIPT = """
+import time
+start = time.perf_counter()
+from service import create_app
+create_app()
+print(time.perf_counter() - start)
+"""
+
+
+class TestAppFactory(TestCase):
+    """Test Cases for create_app"""
+
+    def test_create_app_is_lazy(self):
+        """It should create the app without connecting to the database"""
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:////no/such/directory/products.db"})
+        self.assertIn("sqlalchemy", app.extensions)
+        response = app.test_client().get("/health")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_create_app_config(self):
+        """It should override the configuration with a mapping or an object"""
+        app = create_app({"PAGE_SIZE_MAX": 7})
+        self.assertEqual(app.config["PAGE_SIZE_MAX"], 7)
+
+        class Settings:  # pylint: disable=too-few-public-methods
+            """Settings as attributes"""
+            PAGE_SIZE_MAX = 9
+
+        app = create_app(Settings)
+        self.assertEqual(app.config["PAGE_SIZE_MAX"], 9)
+
+    def test_create_app_engine_options(self):
+        """It should choose the pool from the database the app uses, not the environment"""
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+        with app.app_context():
+            self.assertEqual(type(db.engine.pool).__name__, "StaticPool")
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:////tmp/products.db", "DB_POOL_SIZE": 3})
+        with app.app_context():
+            self.assertEqual(type(db.engine.pool).__name__, "InstrumentedQueuePool")
+            self.assertEqual(db.engine.pool.size(), 3)
+
+    def test_boot_time_budget(self):
+        """It should import the service and create the app within the boot time budget"""
+        env = dict(os.environ, DATABASE_URI="sqlite:////no/such/directory/products.db")
+        result = subprocess.run(
+            [sys.executable, "-c", BOOT_SCRIPT], env=env, capture_output=True, text=True, check=True
+        )
+        boot_time = float(result.stdout.strip().splitlines()[-1])
+        self.assertLess(boot_time, BOOT_TIME_BUDGET)
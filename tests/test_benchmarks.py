@@ -0,0 +1,54 @@
+"""
+Test cases for the Benchmark Suite
+"""
+import os
+import json
+import tempfile
+from unittest import TestCase
+from tests.benchmarks import runner
+from tests.benchmarks.__main__ import main
+
+
+class TestBenchmarks(TestCase):
+    """Test Cases for the benchmark runner"""
+
+    def test_measure(self):
+        """It should time a function and summarize the timings"""
+        calls = []
+        result = runner.measure(lambda: calls.append(1), repeat=4, warmup=2, setup=lambda: calls.append(0))
+        self.assertEqual(calls.count(1), 6)
+        self.assertEqual(calls.count(0), 4)
+        self.assertEqual(result["repeat"], 4)
+        self.assertLessEqual(result["min_ms"], result["median_ms"])
+        self.assertLessEqual(result["median_ms"], result["p95_ms"])
+
+    def test_compare(self):
+        """It should flag benchmarks that got slower than the threshold"""
+        baseline = [{"name": "a", "rows": 10, "median_ms": 1.0}, {"name": "b", "rows": 10, "median_ms": 1.0}]
+        results = [
+            {"name": "a", "rows": 10, "median_ms": 1.1, "p95_ms": 1.2},
+            {"name": "b", "rows": 10, "median_ms": 1.5, "p95_ms": 1.6},
+            {"name": "c", "rows": 10, "median_ms": 9.0, "p95_ms": 9.0},
+        ]
+        comparison = runner.compare(results, baseline, threshold=0.2)
+        self.assertEqual([(row["name"], row["regression"]) for row in comparison], [("a", False), ("b", True)])
+        self.assertIn("REGRESSION", runner.report(results, comparison))
+
+    def test_run_and_compare(self):
+        """It should run the suite, save the results and compare them with a baseline"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            self.assertEqual(main(["--sizes", "20", "--repeat", "1", "--output", output]), 0)
+            with open(output, encoding="utf-8") as results:
+                data = json.load(results)
+            names = {result["name"] for result in data["results"]}
+            self.assertIn("Product.find_by_category", names)
+            self.assertIn("PUT /products/<id>", names)
+            self.assertIn("Product.all + serialize", names)
+            self.assertIn("Product.rows + serialize_row", names)
+            # make the baseline impossibly fast so every benchmark regresses
+            for result in data["results"]:
+                result["median_ms"] = 1e-9
+            with open(output, "w", encoding="utf-8") as baseline:
+                json.dump(data, baseline)
+            self.assertEqual(main(["--sizes", "20", "--repeat", "1", "--only", "serialize", "--baseline", output]), 1)
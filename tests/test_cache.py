@@ -0,0 +1,87 @@
+"""
+Test cases for the LRU Cache
+"""
+from unittest import TestCase
+from service.common.cache import LRUCache
+
+
+class FakeTimer:  # pylint: disable=too-few-public-methods
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(TestCase):
+    """Test Cases for LRUCache"""
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = LRUCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_and_set(self):
+        """It should return cached values and count hits and misses"""
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.5)
+        self.assertEqual(stats["size"], 1)
+
+    def test_evicts_least_recently_used(self):
+        """It should evict the least recently used entry when full"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.get("c"), 3)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_expires_entries(self):
+        """It should expire entries after the time to live"""
+        self.cache.set("a", 1)
+        self.timer.now = 9.9
+        self.assertEqual(self.cache.get("a"), 1)
+        self.timer.now = 10.0
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    def test_invalidate_and_clear(self):
+        """It should remove one or all entries"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.invalidate("a")
+        self.cache.invalidate("missing")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("b"))
+
+    def test_disabled(self):
+        """It should not store anything when the size is 0"""
+        self.cache.configure(maxsize=0, ttl=10)
+        self.cache.set("a", 1)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_set_after_invalidate(self):
+        """It should not cache a value loaded before its key was invalidated"""
+        generation = self.cache.generation(1)
+        self.cache.invalidate(1)
+        self.cache.set(1, "stale", generation)
+        self.assertIsNone(self.cache.get(1))
+        generation = self.cache.generation(1)
+        self.cache.clear()
+        self.cache.set(1, "stale", generation)
+        self.assertIsNone(self.cache.get(1))
+        generation = self.cache.generation(1)
+        self.cache.invalidate(2)  # integers hash to themselves, so 2 has another counter
+        self.cache.set(1, "fresh", generation)
+        self.assertEqual(self.cache.get(1), "fresh")
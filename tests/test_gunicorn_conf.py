@@ -0,0 +1,73 @@
+"""
+Test cases for the Gunicorn configuration
+"""
+import os
+import logging
+import importlib.util
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from sqlalchemy.engine import Engine
+from service import create_app
+from service.common.log_handlers import NonBlockingQueueHandler
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py")
+
+
+def load_config(**env):
+    """Loads gunicorn.conf.py with the given environment variables"""
+    with patch.dict(os.environ, env):
+        spec = importlib.util.spec_from_file_location("gunicorn_conf", CONFIG_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+class TestGunicornConfig(TestCase):
+    """Test Cases for gunicorn.conf.py"""
+
+    def test_defaults(self):
+        """It should size the workers from the CPUs and use threads"""
+        config = load_config()
+        self.assertGreaterEqual(config.available_cpus(), 1)
+        self.assertEqual(config.workers, 2 * config.available_cpus() + 1)
+        self.assertEqual(config.worker_class, "gthread")
+        self.assertEqual(config.threads, 4)
+        self.assertTrue(config.preload_app)
+        self.assertGreater(config.max_requests_jitter, 0)
+
+    def test_overrides(self):
+        """It should take the worker model from the environment"""
+        config = load_config(
+            GUNICORN_WORKERS="3", GUNICORN_WORKER_CLASS="sync", GUNICORN_PRELOAD="false", PORT="9000"
+        )
+        self.assertEqual(config.workers, 3)
+        self.assertEqual(config.threads, 1)
+        self.assertFalse(config.preload_app)
+        self.assertEqual(config.bind, "0.0.0.0:9000")
+
+    def test_post_fork(self):
+        """It should give a forked worker its own connections and log thread"""
+        config = load_config()
+        app = create_app({"LOGGING_LEVEL": logging.CRITICAL})
+        server = MagicMock()
+        server.cfg.preload_app = True
+        server.app.wsgi.return_value = app
+        handler = app.logger.handlers[0]
+        self.assertIsInstance(handler, NonBlockingQueueHandler)
+        old_queue = handler.queue
+        with patch.object(Engine, "dispose") as dispose:
+            config.post_fork(server, MagicMock(pid=42))
+        dispose.assert_called_once_with(close=False)
+        self.assertIsNot(handler.queue, old_queue)
+        self.assertTrue(handler.listener._thread.is_alive())  # pylint: disable=protected-access
+        handler.stop()
+
+    def test_child_exit(self):
+        """It should remove the metrics of a worker that exited"""
+        config = load_config()
+        with patch("prometheus_client.multiprocess.mark_process_dead") as mark_process_dead:
+            config.child_exit(None, MagicMock(pid=42))
+            mark_process_dead.assert_not_called()
+            with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": "/tmp"}):
+                config.child_exit(None, MagicMock(pid=42))
+            mark_process_dead.assert_called_once_with(42)
@@ -0,0 +1,44 @@
+"""
+Test cases for the Product Importer readers
+"""
+import io
+from unittest import TestCase
+from service.common.importer import read_csv, read_ndjson, read_records
+from service.models import DataValidationError
+
+
+class TestReaders(TestCase):
+    """Test Cases for reading import records"""
+
+    def test_read_ndjson(self):
+        """It should read one object per line and report lines that are not objects"""
+        records = list(read_ndjson(io.StringIO('{"name": "Hat"}\n\n[1, 2]\n{bad\n')))
+        self.assertEqual(records[0], (1, {"name": "Hat"}))
+        self.assertEqual([number for number, _ in records], [1, 3, 4])
+        self.assertIsInstance(records[1][1], DataValidationError)
+        self.assertIn("Invalid JSON", str(records[2][1]))
+
+    def test_read_csv(self):
+        """It should convert CSV columns and number records by their first line"""
+        upload = 'id,name,description,price,available,category\n,Hat,"Two\nlines",1,TRUE,CLOTHS\n7,Pot,x,2,0,FOOD,extra\n'
+        records = list(read_csv(io.StringIO(upload, newline="")))
+        number, record = records[0]
+        self.assertEqual(number, 2)
+        self.assertIsNone(record["id"])
+        self.assertIs(record["available"], True)
+        self.assertEqual(record["description"], "Two\nlines")
+        self.assertEqual(records[1][0], 4)
+        self.assertIn("found more", str(records[1][1]))
+
+    def test_read_csv_bad_values(self):
+        """It should report CSV rows with an invalid id or available"""
+        upload = "id,available\nx,true\n1,maybe\n\u00b2,true\n"
+        errors = [str(record) for _, record in read_csv(io.StringIO(upload))]
+        self.assertEqual(errors, ["Invalid id: 'x'", "Invalid available: 'maybe'", "Invalid id: '\u00b2'"])
+
+    def test_read_records_bad_encoding(self):
+        """It should stop with an error when the upload is not UTF-8"""
+        lines = io.TextIOWrapper(io.BytesIO(b'{"name": "Hat"}\n\xff\xfe\n'), encoding="utf-8")
+        records = list(read_records(lines, "ndjson"))
+        self.assertEqual(len(records), 1)
+        self.assertIn("Invalid UTF-8", str(records[0][1]))
@@ -0,0 +1,58 @@
+"""
+Test cases for the JSON Provider
+"""
+import json
+from decimal import Decimal
+from unittest import TestCase
+from flask import Flask
+from service.common.json_provider import JSONProvider, orjson
+from service.models import Category
+
+PAYLOAD = {
+    "id": 1,
+    "name": "Fedora",
+    "description": "A red hat é",
+    "price": Decimal("12.50"),
+    "available": True,
+    "category": Category.CLOTHS,
+}
+
+
+class TestJSONProvider(TestCase):
+    """Test Cases for JSONProvider"""
+
+    def setUp(self):
+        # providers only keep a weak reference to their app
+        self.apps = []
+
+    def make_provider(self, encoder: str) -> JSONProvider:
+        """Creates a provider for an app configured with the given encoder"""
+        app = Flask(__name__)
+        app.config["JSON_ENCODER"] = encoder
+        self.apps.append(app)
+        return JSONProvider(app)
+
+    def test_encodes_decimal_and_category(self):
+        """It should write Decimals as strings and Categories by name"""
+        for encoder in ["auto", "json"]:
+            data = json.loads(self.make_provider(encoder).dumps(PAYLOAD))
+            self.assertEqual(data["price"], "12.50")
+            self.assertEqual(data["category"], "CLOTHS")
+            self.assertEqual(data["description"], "A red hat é")
+
+    def test_encoders_agree(self):
+        """It should produce the same compact output with either encoder"""
+        fast = self.make_provider("auto")
+        slow = self.make_provider("json")
+        self.assertEqual(fast.use_orjson, orjson is not None)
+        self.assertFalse(slow.use_orjson)
+        payload = [dict(PAYLOAD, description="plain")] * 3
+        self.assertEqual(
+            fast.dumps(payload, separators=(",", ":")),
+            slow.dumps(payload, separators=(",", ":")),
+        )
+
+    def test_unsupported_type(self):
+        """It should raise a TypeError for types it cannot encode"""
+        for encoder in ["auto", "json"]:
+            self.assertRaises(TypeError, self.make_provider(encoder).dumps, {"a": object()})
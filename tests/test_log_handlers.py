@@ -0,0 +1,114 @@
+"""
+Test cases for the Log Handlers
+"""
+import sys
+import json
+import queue
+import logging
+import logging.handlers
+from unittest import TestCase
+from service.common.log_handlers import (
+    JSONFormatter, TextFormatter, SamplingFilter, NonBlockingQueueHandler,
+    init_logging, parse_sample_rates, truncate,
+)
+from service import create_app
+
+
+def make_record(level=logging.INFO, name="service", msg="hello %s", args=("world",), **extra):
+    """Creates a LogRecord like a logger would"""
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLogHandlers(TestCase):
+    """Test Cases for the Log Handlers"""
+
+    def test_truncate(self):
+        """It should truncate long messages"""
+        self.assertEqual(truncate("short", 10), "short")
+        self.assertEqual(truncate("x" * 12, 10), "xxxxxxxxxx... [2 characters truncated]")
+        self.assertEqual(truncate("x" * 12, 0), "x" * 12)
+
+    def test_json_formatter(self):
+        """It should format a record as one JSON object with its extra fields"""
+        entry = json.loads(JSONFormatter(8).format(make_record(request_id="abc")))
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "service")
+        self.assertEqual(entry["message"], "hello wo... [3 characters truncated]")
+        self.assertEqual(entry["request_id"], "abc")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("service", logging.ERROR, __file__, 1, "failed", (), sys.exc_info())
+            self.assertIn("ValueError: boom", json.loads(JSONFormatter().format(record))["exception"])
+
+    def test_text_formatter(self):
+        """It should format a record as text with long messages truncated"""
+        line = TextFormatter(5).format(make_record())
+        self.assertIn("[INFO]", line)
+        self.assertIn("hello... [6 characters truncated]", line)
+
+    def test_sampling_filter(self):
+        """It should keep a fraction of the DEBUG and INFO records of a logger"""
+        rates = parse_sample_rates("service=0.25, flask.app=0")
+        self.assertEqual(rates, {"service": 0.25, "flask.app": 0.0})
+        sampler = SamplingFilter(rates, rand=lambda: 0.5)
+        self.assertEqual(sampler.rate("service.routes"), 0.25)
+        self.assertEqual(sampler.rate("other"), 1.0)
+        self.assertFalse(sampler.filter(make_record(name="service.routes")))
+        self.assertTrue(sampler.filter(make_record(name="other")))
+        self.assertTrue(sampler.filter(make_record(level=logging.WARNING, name="flask.app")))
+        sampler = SamplingFilter(rates, rand=lambda: 0.1)
+        self.assertTrue(sampler.filter(make_record(name="service")))
+
+    def test_queue_handler(self):
+        """It should queue records without formatting them and drop them when full"""
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        record = make_record()
+        handler.handle(record)
+        handler.handle(make_record())
+        self.assertEqual(handler.dropped, 1)
+        queued = handler.queue.get_nowait()
+        self.assertIs(queued, record)
+        self.assertEqual(queued.args, ("world",))
+
+    def test_init_logging(self):
+        """It should write the app's records from a background thread"""
+        app = create_app({"LOG_SAMPLE_RATES": "service=0"})
+        gunicorn_logger = logging.getLogger("test.gunicorn")
+        target = logging.handlers.BufferingHandler(10)
+        gunicorn_logger.addHandler(target)
+        gunicorn_logger.setLevel(logging.INFO)
+        try:
+            init_logging(app, "test.gunicorn")
+            app.logger.info("sampled out")
+            app.logger.warning("kept %s", "always", extra={"product_id": 7})
+            handler = app.logger.handlers[0]
+            self.assertIsInstance(handler, NonBlockingQueueHandler)
+            handler.stop()  # waits for the queue to be written
+        finally:
+            gunicorn_logger.removeHandler(target)
+        entries = [json.loads(target.format(record)) for record in target.buffer]
+        self.assertEqual([entry["message"] for entry in entries], ["kept always"])
+        self.assertEqual(entries[0]["product_id"], 7)
+
+    def test_init_logging_shared_logger(self):
+        """It should queue and sample the records of the flask.app logger too"""
+        app = create_app({"LOG_SAMPLE_RATES": "flask.app=0"})
+        gunicorn_logger = logging.getLogger("test.gunicorn")
+        target = logging.handlers.BufferingHandler(10)
+        gunicorn_logger.addHandler(target)
+        gunicorn_logger.setLevel(logging.INFO)
+        try:
+            init_logging(app, "test.gunicorn")
+            shared = logging.getLogger("flask.app")
+            self.assertIs(shared.handlers[0], app.logger.handlers[0])
+            shared.info("sampled out")
+            shared.warning("kept")
+            app.logger.info("not sampled")
+            app.logger.handlers[0].stop()
+        finally:
+            gunicorn_logger.removeHandler(target)
+        messages = [record.getMessage() for record in target.buffer]
+        self.assertEqual(messages, ["Logging handler established", "kept", "not sampled"])
@@ -0,0 +1,52 @@
+"""
+Test cases for the Pool Statistics
+"""
+from unittest import TestCase
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from service.common.pool_stats import Histogram, InstrumentedQueuePool, pool_stats, telemetry
+
+
+class TestHistogram(TestCase):
+    """Test Cases for Histogram"""
+
+    def test_observe(self):
+        """It should count durations into cumulative buckets"""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05, 0.5, 0.7, 2.0]:
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["buckets"], {"0.1": 1, "1.0": 3, "+Inf": 4})
+        self.assertEqual(snapshot["count"], 4)
+        self.assertAlmostEqual(snapshot["sum"], 3.25)
+
+
+class TestInstrumentedQueuePool(TestCase):
+    """Test Cases for InstrumentedQueuePool"""
+
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.01
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_records_checkouts(self):
+        """It should record the wait of every checkout and report the pool state"""
+        count = telemetry.wait.count
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            stats = pool_stats(self.engine)
+            self.assertEqual(stats["pool"], "InstrumentedQueuePool")
+            self.assertEqual(stats["size"], 1)
+            self.assertEqual(stats["checked_out"], 1)
+        self.assertEqual(pool_stats(self.engine)["checked_out"], 0)
+        self.assertEqual(telemetry.wait.count, count + 1)
+
+    def test_records_timeouts(self):
+        """It should count checkouts that time out"""
+        timeouts = telemetry.timeouts
+        with self.engine.connect():
+            self.assertRaises(PoolTimeoutError, self.engine.connect)
+        self.assertEqual(telemetry.timeouts, timeouts + 1)
@@ -0,0 +1,68 @@
+"""
+Test cases for the Group Summary
+"""
+from unittest import TestCase
+from service.common.summary import GroupSummary
+
+
+class FakeTimer:  # pylint: disable=too-few-public-methods
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestGroupSummary(TestCase):
+    """Test Cases for GroupSummary"""
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.summary = GroupSummary(ttl=10, timer=self.timer)
+        self.summary.load({"a": (2, 1, 5, 6)}, {"p50": 1})
+
+    def test_snapshot(self):
+        """It should return the loaded groups until they expire"""
+        self.assertEqual(self.summary.snapshot(), ({"a": (2, 1, 5, 6)}, {"p50": 1}))
+        self.timer.now = 10.0
+        self.assertIsNone(self.summary.snapshot())
+        self.assertIsNone(GroupSummary().snapshot())
+
+    def test_add(self):
+        """It should add rows to their groups"""
+        self.summary.add("a", 7)
+        self.summary.add("b", 3)
+        groups, _ = self.summary.snapshot()
+        self.assertEqual(groups, {"a": (3, 1, 7, 13), "b": (1, 3, 3, 3)})
+        self.assertEqual(self.summary.updates, 2)
+
+    def test_remove(self):
+        """It should remove rows and go stale when the minimum or maximum is removed"""
+        self.summary.add("a", 3)
+        self.summary.remove("a", 3)
+        groups, _ = self.summary.snapshot()
+        self.assertEqual(groups, {"a": (2, 1, 5, 6)})
+        self.summary.remove("a", 5)
+        self.assertIsNone(self.summary.snapshot())
+
+    def test_remove_last_row(self):
+        """It should drop a group when its last row is removed"""
+        self.summary.add("b", 3)
+        self.summary.remove("b", 3)
+        groups, _ = self.summary.snapshot()
+        self.assertEqual(groups, {"a": (2, 1, 5, 6)})
+        self.summary.remove("c", 1)
+        self.assertIsNone(self.summary.snapshot())
+
+    def test_load_after_a_write(self):
+        """It should not load groups that were read before a write"""
+        self.summary.invalidate()
+        version = self.summary.version
+        self.summary.add("a", 1)
+        self.summary.load({"a": (1, 1, 1, 1)}, version=version)
+        self.assertIsNone(self.summary.snapshot())
+        self.summary.load({"a": (1, 1, 1, 1)}, version=self.summary.version)
+        self.assertIsNotNone(self.summary.snapshot())
+        self.assertEqual(self.summary.loads, 2)